@@ -17,8 +17,8 @@ setup(
     package_dir={"": "src"},
     install_requires=[
         "opencv-contrib-python==4.11.0.86",
+        "mss>=9.0.0",
         "pyautogui==0.9.54",
-        "pydirectinput-rgx",
         "pynput==1.8.0",
         "scikit-image==0.25.2",
         "numpy",
@@ -0,0 +1,428 @@
+"""Headless matcher benchmark on synthetic screens.
+
+    python -m src.benchmark --resolutions 1080p,1440p,4k --output bench.json
+    python -m src.benchmark --baseline bench.json   # exit code 1 on regressions
+
+Each scenario draws a UI-like screen, pastes templates at known positions
+(optionally rescaled) plus adds sensor-style noise, and also asks for
+templates that are not on screen at all. Every method in METHODS is timed
+per template query, each on a fresh frame so screen feature extraction is
+billed to every query. The end-to-end find_best_matches is timed per scan
+cycle over the scenario's whole template set, so the batched FFT and
+indexed feature paths are measured as they run in a real scan. Results
+are scored against the ground truth. Needs no display: frames come
+straight from memory.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from . import state
+from .capture import Frame
+from .cascade import method_stats
+from .locations import location_memory
+from .matchers import METHODS, find_best_matches, pyautogui
+from .parallel import shutdown_pools
+from .templates import template_cache
+
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+END_TO_END = "find_best_matches"
+# (min, max) template width and height; feature methods need room for keypoints
+TEMPLATE_SIZE = ((96, 224), (72, 168))
+
+# A hit counts as correct within this fraction of the placed template's short side
+POSITION_TOLERANCE = 0.25
+MIN_POSITION_TOLERANCE = 6
+
+# Regression gates for --baseline
+MAX_SLOWDOWN = 0.25
+MAX_RECALL_DROP = 0.05
+MAX_FPR_RISE = 0.05
+
+
+class Placement:
+    def __init__(self, path: str, center: Optional[Tuple[int, int]], size: Tuple[int, int]):
+        self.path = path
+        self.center = center  # None for templates that are not on screen
+        self.size = size
+
+
+class Scenario:
+    def __init__(self, resolution: str, scale: float, noise: float, trial: int,
+                 screen: np.ndarray, placements: List[Placement]):
+        self.resolution = resolution
+        self.scale = scale
+        self.noise = noise
+        self.trial = trial
+        self.screen = screen
+        self.placements = placements
+
+
+def synthetic_screen(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """Gradient desktop with panels, borders and text lines."""
+    x_ramp = np.linspace(0, rng.uniform(-40, 40), width, dtype=np.float32)
+    y_ramp = np.linspace(0, rng.uniform(-40, 40), height, dtype=np.float32)
+    screen = np.clip(rng.uniform(60, 190) + x_ramp[None, :] + y_ramp[:, None], 0, 255).astype(np.uint8)
+    area = width * height
+    for _ in range(max(4, area // 120_000)):
+        w, h = int(rng.integers(width // 12, width // 3)), int(rng.integers(height // 12, height // 3))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), int(rng.integers(0, 256)), -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + h), int(rng.integers(0, 256)), int(rng.integers(1, 4)))
+    for _ in range(max(10, area // 25_000)):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(12, height))
+        cv2.putText(screen, _random_text(rng, 4, 16), (x, y), int(rng.choice([0, 1, 2, 3, 4])),
+                    rng.uniform(0.35, 0.8), int(rng.integers(0, 256)), 1, cv2.LINE_AA)
+    return screen
+
+
+def synthetic_template(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """A distinctive icon: filled shapes, outlines and a short label."""
+    icon = np.full((height, width), int(rng.integers(20, 236)), dtype=np.uint8)
+    for _ in range(int(rng.integers(6, 13))):
+        color = int(rng.integers(0, 256))
+        kind = rng.integers(0, 3)
+        p1 = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        p2 = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        if kind == 0:
+            cv2.rectangle(icon, p1, p2, color, int(rng.choice([-1, 2])))
+        elif kind == 1:
+            cv2.circle(icon, p1, int(rng.integers(4, max(5, min(width, height) // 2))), color, int(rng.choice([-1, 2])))
+        else:
+            cv2.line(icon, p1, p2, color, int(rng.integers(1, 4)), cv2.LINE_AA)
+    for line in range(2):
+        cv2.putText(icon, _random_text(rng, 2, 5), (int(width * 0.08), int(height * (0.4 + 0.4 * line))),
+                    cv2.FONT_HERSHEY_SIMPLEX, min(width, height) / 90.0, int(255 - icon[0, 0]), 2, cv2.LINE_AA)
+    return icon
+
+
+def _random_text(rng: np.random.Generator, min_len: int, max_len: int) -> str:
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    return "".join(rng.choice(list(alphabet), size=int(rng.integers(min_len, max_len + 1))))
+
+
+def build_scenario(rng: np.random.Generator, folder: str, resolution: str, scale: float, noise: float,
+                   trial: int, present: int, absent: int) -> Scenario:
+    width, height = RESOLUTIONS[resolution]
+    screen = synthetic_screen(rng, width, height)
+    placements: List[Placement] = []
+    taken: List[Tuple[int, int, int, int]] = []
+    for i in range(present + absent):
+        (min_w, max_w), (min_h, max_h) = TEMPLATE_SIZE
+        tw, th = int(rng.integers(min_w, max_w + 1)), int(rng.integers(min_h, max_h + 1))
+        template = synthetic_template(rng, tw, th)
+        path = os.path.join(folder, f"{resolution}_s{scale}_n{noise}_t{trial}_{i}.png")
+        cv2.imwrite(path, template)
+        if i >= present:
+            placements.append(Placement(path, None, (tw, th)))
+            continue
+        sw, sh = max(8, int(round(tw * scale))), max(8, int(round(th * scale)))
+        placed = cv2.resize(template, (sw, sh), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        for _ in range(100):
+            x, y = int(rng.integers(0, width - sw)), int(rng.integers(0, height - sh))
+            if all(x + sw < ox0 or ox1 < x or y + sh < oy0 or oy1 < y for ox0, oy0, ox1, oy1 in taken):
+                break
+        taken.append((x, y, x + sw, y + sh))
+        screen[y:y + sh, x:x + sw] = placed
+        placements.append(Placement(path, (x + sw // 2, y + sh // 2), (sw, sh)))
+    if noise > 0:
+        screen = np.clip(screen + rng.normal(0, noise, screen.shape), 0, 255).astype(np.uint8)
+    return Scenario(resolution, scale, noise, trial, screen, placements)
+
+
+class Tally:
+    """Latencies and outcomes of one (resolution, method, condition) cell.
+
+    Latencies are per template query, or per scan cycle for END_TO_END.
+    """
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.present = 0
+        self.absent = 0
+        self.true_positives = 0
+        self.mislocated = 0
+        self.false_positives = 0
+
+    def add(self, seconds: float, placement: Placement, center: Optional[Tuple[int, int]]) -> None:
+        self.latencies.append(seconds)
+        self.score(placement, center)
+
+    def add_cycle(self, seconds: float, outcomes: List[Tuple[Placement, Optional[Tuple[int, int]]]]) -> None:
+        self.latencies.append(seconds)
+        for placement, center in outcomes:
+            self.score(placement, center)
+
+    def score(self, placement: Placement, center: Optional[Tuple[int, int]]) -> None:
+        if placement.center is None:
+            self.absent += 1
+            if center is not None:
+                self.false_positives += 1
+            return
+        self.present += 1
+        if center is None:
+            return
+        tolerance = max(MIN_POSITION_TOLERANCE, POSITION_TOLERANCE * min(placement.size))
+        if np.hypot(center[0] - placement.center[0], center[1] - placement.center[1]) <= tolerance:
+            self.true_positives += 1
+        else:
+            self.mislocated += 1
+
+    def merge(self, other: "Tally") -> None:
+        self.latencies.extend(other.latencies)
+        for field in ("present", "absent", "true_positives", "mislocated", "false_positives"):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def summary(self) -> Dict[str, Any]:
+        lat = np.asarray(self.latencies, dtype=np.float64) * 1000.0
+        latency = {
+            "p50": float(np.percentile(lat, 50)), "p90": float(np.percentile(lat, 90)),
+            "p99": float(np.percentile(lat, 99)), "mean": float(lat.mean()), "max": float(lat.max()),
+        } if lat.size else {}
+        return {
+            "queries": self.present + self.absent,
+            "timings": len(self.latencies),
+            "latency_ms": {k: round(v, 3) for k, v in latency.items()},
+            "present": self.present,
+            "absent": self.absent,
+            "true_positives": self.true_positives,
+            "mislocated": self.mislocated,
+            "false_positives": self.false_positives,
+            "recall": round(self.true_positives / self.present, 4) if self.present else None,
+            # Hits for templates that are not on screen, over those queries only
+            "false_positive_rate": round(self.false_positives / self.absent, 4) if self.absent else None,
+            # Hits for on-screen templates, but at the wrong place
+            "mislocation_rate": round(self.mislocated / self.present, 4) if self.present else None,
+        }
+
+
+def _fresh_session() -> None:
+    # Matching results must depend on the scenario only, not on earlier queries
+    location_memory.clear()
+    method_stats.clear()
+
+
+def run_query(method: str, path: str, frame: Frame) -> Tuple[float, Optional[Tuple[int, int]]]:
+    func = dict(METHODS)[method]
+    start = time.perf_counter()
+    res = func(path, frame=frame)
+    elapsed = time.perf_counter() - start
+    center = res[0] if res is not None and res[0] is not None else None
+    return elapsed, (int(center[0]), int(center[1])) if center is not None else None
+
+
+def run_cycle(selection_flags: List[bool], scenario: Scenario) -> Tuple[float, List[Tuple[Placement, Optional[Tuple[int, int]]]]]:
+    """One end-to-end scan cycle over every template of the scenario."""
+    frame = Frame(scenario.screen)
+    start = time.perf_counter()
+    results = find_best_matches(selection_flags, [p.path for p in scenario.placements], frame=frame)
+    elapsed = time.perf_counter() - start
+    outcomes = []
+    for placement in scenario.placements:
+        center = results[placement.path][0]
+        outcomes.append((placement, (int(center[0]), int(center[1])) if center is not None else None))
+    return elapsed, outcomes
+
+
+def benchmark(scenarios: Sequence[Scenario], methods: List[str], selection_flags: List[bool],
+              progress: Callable[[str], None]) -> Dict[Tuple[str, str, float, float], Tally]:
+    tallies: Dict[Tuple[str, str, float, float], Tally] = {}
+    for n, scenario in enumerate(scenarios, 1):
+        progress(f"[{n}/{len(scenarios)}] {scenario.resolution} scale={scenario.scale} noise={scenario.noise}")
+        for method in methods:
+            tally = tallies.setdefault((scenario.resolution, method, scenario.scale, scenario.noise), Tally())
+            _fresh_session()
+            if method == END_TO_END:
+                tally.add_cycle(*run_cycle(selection_flags, scenario))
+                continue
+            for placement in scenario.placements:
+                _fresh_session()
+                # A fresh frame per query: nothing derived from the screen is shared between queries
+                elapsed, center = run_query(method, placement.path, Frame(scenario.screen))
+                tally.add(elapsed, placement, center)
+    return tallies
+
+
+def warm_up(scenario: Scenario, methods: List[str], selection_flags: List[bool]) -> None:
+    """One untimed pass so detector/pool construction is not billed to the first query."""
+    for method in methods:
+        _fresh_session()
+        if method == END_TO_END:
+            run_cycle(selection_flags, scenario)
+        else:
+            run_query(method, scenario.placements[0].path, Frame(scenario.screen))
+
+
+def report(tallies: Dict[Tuple[str, str, float, float], Tally], args: argparse.Namespace, methods: List[str],
+           skipped: Dict[str, str]) -> Dict[str, Any]:
+    conditions = []
+    totals: Dict[Tuple[str, str], Tally] = {}
+    for (resolution, method, scale, noise), tally in tallies.items():
+        conditions.append({"resolution": resolution, "method": method, "scale": scale, "noise": noise, **tally.summary()})
+        totals.setdefault((resolution, method), Tally()).merge(tally)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "mode": state.MODE,
+            "seed": args.seed,
+            "trials": args.trials,
+            "templates": {"present": args.present, "absent": args.absent},
+            "scales": args.scales,
+            "noise": args.noise,
+            "methods": methods,
+            "skipped": skipped,
+        },
+        "summary": [
+            {"resolution": resolution, "method": method, **tally.summary()}
+            for (resolution, method), tally in totals.items()
+        ],
+        "conditions": conditions,
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_slowdown: float) -> List[str]:
+    """Regressions of `result` against a previous run of the same benchmark."""
+    previous = {(s["resolution"], s["method"]): s for s in baseline.get("summary", [])}
+    regressions: List[str] = []
+    for current in result["summary"]:
+        key = (current["resolution"], current["method"])
+        before = previous.get(key)
+        if before is None:
+            continue
+        label = f"{key[1]} @ {key[0]}"
+        old_p50, new_p50 = before["latency_ms"].get("p50"), current["latency_ms"].get("p50")
+        if old_p50 and new_p50 and new_p50 > old_p50 * (1.0 + max_slowdown):
+            regressions.append(f"{label}: p50 latency {old_p50:.1f} ms -> {new_p50:.1f} ms")
+        if before["recall"] is not None and current["recall"] is not None \
+                and current["recall"] < before["recall"] - MAX_RECALL_DROP:
+            regressions.append(f"{label}: recall {before['recall']:.3f} -> {current['recall']:.3f}")
+        for rate, name in (("false_positive_rate", "false-positive rate"), ("mislocation_rate", "mislocation rate")):
+            old_rate, new_rate = before.get(rate), current.get(rate)
+            if old_rate is not None and new_rate is not None and new_rate > old_rate + MAX_FPR_RISE:
+                regressions.append(f"{label}: {name} {old_rate:.3f} -> {new_rate:.3f}")
+    return regressions
+
+
+def _float_list(text: str) -> List[float]:
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    method_names = [name for name, _ in METHODS]
+    parser = argparse.ArgumentParser(prog="python -m src.benchmark", description=__doc__.splitlines()[0])
+    parser.add_argument("--resolutions", default="1080p,1440p,4k",
+                        help=f"comma-separated, from {', '.join(RESOLUTIONS)} (default: %(default)s)")
+    parser.add_argument("--methods", default="all",
+                        help="comma-separated method indexes (1-5, as in the menu) or 'all' (default: %(default)s)")
+    parser.add_argument("--no-end-to-end", action="store_true", help="skip the find_best_matches measurement")
+    parser.add_argument("--scales", type=_float_list, default=[1.0, 0.9],
+                        help="on-screen scale of placed templates (default: 1.0,0.9)")
+    parser.add_argument("--noise", type=_float_list, default=[0.0, 4.0],
+                        help="Gaussian noise sigma added to screens (default: 0,4)")
+    parser.add_argument("--trials", type=int, default=2, help="screens per condition (default: %(default)s)")
+    # 16 templates per screen by default, enough for the batched and indexed full-screen paths
+    parser.add_argument("--present", type=int, default=12, help="templates placed per screen (default: %(default)s)")
+    parser.add_argument("--absent", type=int, default=4, help="templates not on screen (default: %(default)s)")
+    parser.add_argument("--mode", choices=["performance", "accuracy"], default="performance")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report; exit with status 1 on regressions")
+    parser.add_argument("--max-slowdown", type=float, default=MAX_SLOWDOWN,
+                        help="allowed p50 latency increase vs the baseline (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="no progress on stderr")
+    args = parser.parse_args(argv)
+    args.resolutions = [r.strip().lower() for r in args.resolutions.split(",") if r.strip()]
+    unknown = [r for r in args.resolutions if r not in RESOLUTIONS]
+    if unknown:
+        parser.error(f"unknown resolution(s): {', '.join(unknown)}")
+    if args.methods == "all":
+        args.method_indexes = list(range(len(method_names)))
+    else:
+        try:
+            args.method_indexes = sorted({int(v) - 1 for v in args.methods.split(",")})
+        except ValueError:
+            parser.error("--methods takes numbers like 2,3,5")
+        if any(i < 0 or i >= len(method_names) for i in args.method_indexes):
+            parser.error(f"--methods must be between 1 and {len(method_names)}")
+    return args
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    progress = (lambda msg: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr, flush=True))
+
+    state.MODE = args.mode
+    state.ACCURACY_THRESHOLDS.update(state.DEFAULT_ACCURACY_THRESHOLDS)
+    skipped: Dict[str, str] = {}
+    selection_flags = [False] * len(METHODS)
+    methods: List[str] = []
+    for idx in args.method_indexes:
+        name = METHODS[idx][0]
+        if idx == 0 and pyautogui is None:
+            skipped[name] = "pyautogui could not be imported (no display)"
+            continue
+        selection_flags[idx] = True
+        methods.append(name)
+    if not args.no_end_to_end and methods:
+        methods.append(END_TO_END)
+    if not methods:
+        print("No runnable methods selected.", file=sys.stderr)
+        return 2
+
+    rng = np.random.default_rng(args.seed)
+    try:
+        with tempfile.TemporaryDirectory(prefix="yasumi_bench_") as folder:
+            tallies: Dict[Tuple[str, str, float, float], Tally] = {}
+            for resolution in args.resolutions:
+                scenarios = [
+                    build_scenario(rng, folder, resolution, scale, noise, trial, args.present, args.absent)
+                    for scale in args.scales for noise in args.noise for trial in range(args.trials)
+                ]
+                warm_up(scenarios[0], methods, selection_flags)
+                tallies.update(benchmark(scenarios, methods, selection_flags, progress))
+                # Templates differ per resolution; keep memory flat across the run
+                template_cache.clear()
+    finally:
+        shutdown_pools()
+
+    result = report(tallies, args, methods, skipped)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        result["regressions"] = compare(result, baseline, args.max_slowdown)
+        for line in result["regressions"]:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        status = 1 if result["regressions"] else 0
+
+    text = json.dumps(result, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
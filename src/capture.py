@@ -0,0 +1,374 @@
+import glob
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from . import state
+from .metrics import metrics
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+try:
+    import pyautogui
+except Exception:  # pyautogui needs a display; headless boxes only use file sources
+    pyautogui = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".npy", ".npz")
+
+
+class Frame:
+    """A single grayscale screen capture shared by every matcher in a scan.
+
+    `cache` holds per-frame derived data (features, pyramids, spectra...) so
+    it is computed once per frame no matter how many templates use it.
+    """
+
+    def __init__(self, gray: np.ndarray, timestamp: Optional[float] = None, index: int = 0):
+        self.gray = gray
+        self.timestamp = time.perf_counter() if timestamp is None else timestamp
+        self.index = index
+        self.cache: Dict[Any, Any] = {}
+        self.lock = threading.Lock()
+        self._key_locks: Dict[Any, threading.Lock] = {}
+        # Position of this frame's top-left pixel on the full screen (non-zero for crops)
+        self.offset: Tuple[int, int] = (0, 0)
+        # The frame this one was cropped from, so crops can slice its cached images
+        self.parent: Optional["Frame"] = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        h, w = self.gray.shape[:2]
+        return w, h
+
+    def cached(self, key: Any, compute: Callable[[], Any]) -> Any:
+        """Return `cache[key]`, computing it once even when many threads ask at once."""
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self.cache:
+                self.cache[key] = compute()
+            return self.cache[key]
+
+    def crop(self, region: Tuple[int, int, int, int]) -> "Frame":
+        """Sub-frame for (x0, y0, x1, y1), shared so its own cache is reused per region."""
+        def make() -> "Frame":
+            x0, y0, x1, y1 = region
+            sub = Frame(self.gray[y0:y1, x0:x1], timestamp=self.timestamp, index=self.index)
+            sub.offset = (self.offset[0] + x0, self.offset[1] + y0)
+            sub.parent = self
+            return sub
+        return self.cached(("crop", region), make)
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """Convert an RGB/RGBA/gray array to a contiguous uint8 grayscale array."""
+    if image.ndim == 2:
+        gray = image
+    elif image.shape[2] == 4:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if gray.dtype != np.uint8:
+        gray = np.clip(gray, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(gray)
+
+
+class FrameSource:
+    """Base class for everything the matchers can pull screen frames from."""
+
+    def grab(self) -> Frame:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class ScreenFrameSource(FrameSource):
+    """Live screen capture.
+
+    Uses mss (XShm on Linux, BitBlt on Windows, CoreGraphics on macOS) when it
+    is installed and falls back to pyautogui.screenshot() otherwise.
+    """
+
+    def __init__(self, monitor: int = 1):
+        self.monitor = monitor
+        self._local = threading.local()
+        self._index = 0
+        self._index_lock = threading.Lock()
+        if mss is None and pyautogui is None:
+            raise RuntimeError("No screen capture backend available (install 'mss' or 'pyautogui').")
+        if mss is None:
+            logger.warning("mss not installed; falling back to pyautogui.screenshot() for capture.")
+
+    def _next_index(self) -> int:
+        with self._index_lock:
+            self._index += 1
+            return self._index
+
+    def grab(self) -> Frame:
+        if mss is not None:
+            # mss handles are not thread-safe, keep one per capturing thread
+            sct = getattr(self._local, "sct", None)
+            if sct is None:
+                sct = self._local.sct = mss.mss()
+            with metrics.stage("capture"):
+                shot = np.asarray(sct.grab(sct.monitors[self.monitor]))
+            with metrics.stage("grayscale"):
+                gray = cv2.cvtColor(shot, cv2.COLOR_BGRA2GRAY)
+        else:
+            with metrics.stage("capture"):
+                shot = np.array(pyautogui.screenshot())
+            with metrics.stage("grayscale"):
+                gray = cv2.cvtColor(shot, cv2.COLOR_RGB2GRAY)
+        return Frame(gray, index=self._next_index())
+
+    def close(self) -> None:
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class StaticFrameSource(FrameSource):
+    """Serves a fixed sequence of in-memory frames, looping by default."""
+
+    def __init__(self, images: Sequence[np.ndarray], loop: bool = True):
+        if not images:
+            raise ValueError("StaticFrameSource needs at least one frame.")
+        self.images: List[np.ndarray] = [to_gray(img) for img in images]
+        self.loop = loop
+        self._pos = 0
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def grab(self) -> Frame:
+        with self._lock:
+            if self._pos >= len(self.images):
+                if not self.loop:
+                    raise StopIteration("Frame source exhausted.")
+                self._pos = 0
+            gray = self.images[self._pos]
+            self._pos += 1
+            self._index += 1
+            index = self._index
+        return Frame(gray, index=index)
+
+
+class FileFrameSource(StaticFrameSource):
+    """Replays recorded frames from an image/NPY/NPZ file or a directory of them.
+
+    NPZ archives may hold several frames, either as a single (N, H, W[, C])
+    array or as one array per key.
+    """
+
+    def __init__(self, path: str, loop: bool = True):
+        super().__init__(load_frames(path), loop=loop)
+        self.path = path
+
+
+def load_frames(path: str) -> List[np.ndarray]:
+    if os.path.isdir(path):
+        files = sorted(
+            f for f in glob.glob(os.path.join(path, "*"))
+            if f.lower().endswith(FRAME_EXTENSIONS)
+        )
+    else:
+        files = [path]
+    frames: List[np.ndarray] = []
+    for file_path in files:
+        lower = file_path.lower()
+        if lower.endswith(".npz"):
+            with np.load(file_path) as archive:
+                for key in archive.files:
+                    frames.extend(_split_stack(archive[key]))
+        elif lower.endswith(".npy"):
+            frames.extend(_split_stack(np.load(file_path)))
+        else:
+            image = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                logger.error("Could not read frame file: %s", file_path)
+                continue
+            frames.append(image)
+    if not frames:
+        raise FileNotFoundError(f"No frames found at {path}")
+    return frames
+
+
+def _split_stack(array: np.ndarray) -> List[np.ndarray]:
+    # (H, W) and (H, W, C) are single frames, (N, H, W[, C]) is a stack
+    if array.ndim == 2 or (array.ndim == 3 and array.shape[2] in (3, 4)):
+        return [array]
+    return list(array)
+
+
+_frame_source: Optional[FrameSource] = None
+_frame_source_lock = threading.Lock()
+
+
+def get_frame_source() -> FrameSource:
+    """Return the active frame source, creating the default one on first use.
+
+    Setting YASUMI_FRAME_SOURCE to a file or directory replays recorded frames
+    instead of capturing the screen.
+    """
+    global _frame_source
+    with _frame_source_lock:
+        if _frame_source is None:
+            replay_path = os.environ.get("YASUMI_FRAME_SOURCE")
+            if replay_path:
+                _frame_source = FileFrameSource(replay_path)
+            else:
+                _frame_source = ScreenFrameSource()
+        return _frame_source
+
+
+def set_frame_source(source: Optional[FrameSource]) -> None:
+    global _frame_source
+    with _frame_source_lock:
+        if _frame_source is not None and _frame_source is not source:
+            _frame_source.close()
+        _frame_source = source
+
+
+def grab_frame() -> Frame:
+    return get_frame_source().grab()
+
+
+class ChangeSet:
+    """Screen regions that changed since the reference frame; `tiles=None` means everything.
+
+    `cells` are the same tiles in thumbnail pixels, used to advance the
+    reference tile by tile.
+    """
+
+    def __init__(self, tiles: Optional[List[Tuple[int, int, int, int]]],
+                 cells: Optional[List[Tuple[int, int, int, int]]] = None):
+        self.tiles = tiles
+        self.cells = cells if cells is not None else []
+
+    @property
+    def everything(self) -> bool:
+        return self.tiles is None
+
+    def __bool__(self) -> bool:
+        return self.tiles is None or len(self.tiles) > 0
+
+    def overlaps(self, region: Optional[Tuple[int, int, int, int]]) -> bool:
+        if self.tiles is None or region is None:
+            return bool(self)
+        return any(_intersects(tile, region) for tile in self.tiles)
+
+    def within(self, regions: List[Optional[Tuple[int, int, int, int]]]) -> "ChangeSet":
+        """The changed tiles overlapping any of `regions`, None meaning the whole screen."""
+        if self.tiles is None or any(region is None for region in regions):
+            return self
+        keep = [i for i, tile in enumerate(self.tiles) if any(_intersects(tile, region) for region in regions)]
+        return ChangeSet([self.tiles[i] for i in keep], [self.cells[i] for i in keep])
+
+
+def _intersects(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class FrameChangeDetector:
+    """Cheap tile-level diff between a frame and what was last actually matched.
+
+    Each frame is area-downsampled so one thumbnail pixel covers `cell_size`
+    screen pixels; a tile of the `grid` counts as changed when any of its
+    thumbnail pixels moved by more than `tolerance` gray levels. Settings come
+    from the change_detection config section. The reference only advances
+    for the tiles that were re-matched, so changes below the tolerance add
+    up until they are seen. It is tied to a `key` (the template set it was
+    matched with); a different key reports everything as changed.
+    """
+
+    def __init__(self):
+        self._reference: Optional[np.ndarray] = None
+        self._reference_shape: Optional[Tuple[int, ...]] = None
+        self._reference_key: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(state.CHANGE_DETECTION.get("enabled", True))
+
+    def _thumbnail(self, frame: Frame) -> np.ndarray:
+        cell_size = max(1, int(state.CHANGE_DETECTION.get("cell_size", 16)))
+        def make() -> np.ndarray:
+            h, w = frame.gray.shape[:2]
+            size = (max(1, w // cell_size), max(1, h // cell_size))
+            return cv2.resize(frame.gray, size, interpolation=cv2.INTER_AREA)
+        return frame.cached(("thumbnail", cell_size), make)
+
+    def changes(self, frame: Frame, key: Any = None) -> ChangeSet:
+        thumb = self._thumbnail(frame)
+        with self._lock:
+            reference = self._reference
+            same_geometry = reference is not None and self._reference_shape == frame.gray.shape
+            same_key = self._reference_key == key
+        if not same_geometry or not same_key or reference.shape != thumb.shape:
+            return ChangeSet(None)
+        if np.array_equal(thumb, reference):
+            return ChangeSet([])
+        changed = cv2.absdiff(thumb, reference) > float(state.CHANGE_DETECTION.get("tolerance", 4))
+        if not changed.any():
+            return ChangeSet([])
+        screen_h, screen_w = frame.gray.shape[:2]
+        thumb_h, thumb_w = thumb.shape[:2]
+        cols, rows = state.CHANGE_DETECTION.get("grid", (16, 9))
+        tiles: List[Tuple[int, int, int, int]] = []
+        cells: List[Tuple[int, int, int, int]] = []
+        for r in range(rows):
+            ty0, ty1 = r * thumb_h // rows, (r + 1) * thumb_h // rows
+            for c in range(cols):
+                tx0, tx1 = c * thumb_w // cols, (c + 1) * thumb_w // cols
+                if ty1 > ty0 and tx1 > tx0 and changed[ty0:ty1, tx0:tx1].any():
+                    # Map back to screen pixels; the last row/column absorbs the remainder
+                    tiles.append((
+                        tx0 * screen_w // thumb_w, ty0 * screen_h // thumb_h,
+                        screen_w if tx1 == thumb_w else tx1 * screen_w // thumb_w,
+                        screen_h if ty1 == thumb_h else ty1 * screen_h // thumb_h,
+                    ))
+                    cells.append((tx0, ty0, tx1, ty1))
+        return ChangeSet(tiles, cells)
+
+    def accept(self, frame: Frame, key: Any = None, changes: Optional[ChangeSet] = None) -> None:
+        """Advance the reference to `frame`, matched with `key`.
+
+        With `changes`, only those tiles are taken from `frame` (the parts
+        that were re-matched); otherwise the whole frame becomes the reference.
+        """
+        thumb = self._thumbnail(frame)
+        with self._lock:
+            if changes is None or changes.everything or self._reference is None:
+                self._reference = thumb
+                self._reference_shape = frame.gray.shape
+                self._reference_key = key
+                return
+            if not changes.cells:
+                return
+            reference = self._reference.copy()
+            for x0, y0, x1, y1 in changes.cells:
+                reference[y0:y1, x0:x1] = thumb[y0:y1, x0:x1]
+            self._reference = reference
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reference = None
+            self._reference_shape = None
+            self._reference_key = None
+
+
+change_detector = FrameChangeDetector()
@@ -0,0 +1,73 @@
+import threading
+from typing import Dict, List, Tuple
+
+from . import state
+
+# Rough per-call latency (seconds) used until a method has been measured
+PRIOR_LATENCY = {
+    "Grayscale Template Matching": 0.02,
+    "PyAutoGUI Matching": 0.05,
+    "ORB Feature Matching": 0.05,
+    "AKAZE Feature Matching": 0.15,
+    "SIFT Feature Matching": 0.4,
+}
+PRIOR_HIT_RATE = 0.5
+
+
+class MethodStats:
+    """Running latency and hit-rate estimates per (template, method).
+
+    Latency is an exponential moving average; the hit rate is a smoothed
+    ratio so a single miss does not bury a method. Templates with too few
+    samples borrow the method's statistics across all templates.
+    """
+
+    def __init__(self):
+        # key -> [ema latency, hits, runs]
+        self._stats: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, template_path: str, method_name: str, latency: float, hit: bool) -> None:
+        alpha = float(state.CASCADE.get("smoothing", 0.2))
+        with self._lock:
+            for key in ((template_path, method_name), ("*", method_name)):
+                entry = self._stats.get(key)
+                if entry is None:
+                    self._stats[key] = [latency, float(hit), 1.0]
+                else:
+                    entry[0] += alpha * (latency - entry[0])
+                    entry[1] += float(hit)
+                    entry[2] += 1.0
+
+    def _estimate(self, template_path: str, method_name: str) -> Tuple[float, float]:
+        min_samples = int(state.CASCADE.get("min_samples", 3))
+        for key in ((template_path, method_name), ("*", method_name)):
+            entry = self._stats.get(key)
+            if entry is not None and entry[2] >= min_samples:
+                latency, hits, runs = entry
+                # Laplace-smoothed toward the prior
+                return latency, (hits + PRIOR_HIT_RATE) / (runs + 1.0)
+        return PRIOR_LATENCY.get(method_name, 0.1), PRIOR_HIT_RATE
+
+    def expected_cost(self, template_path: str, method_name: str) -> float:
+        """Seconds spent per hit when this method is tried on its own."""
+        latency, hit_rate = self._estimate(template_path, method_name)
+        return latency / max(hit_rate, 0.01)
+
+    def order(self, template_path: str, method_names: List[str]) -> List[str]:
+        with self._lock:
+            return sorted(method_names, key=lambda name: self.expected_cost(template_path, name))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                f"{tpl} | {method}": {"latency": entry[0], "hits": entry[1], "runs": entry[2]}
+                for (tpl, method), entry in self._stats.items()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+method_stats = MethodStats()
@@ -1,45 +1,205 @@
+import copy
 import os
 import json
+import hashlib
 import platform
+import re
+import threading
 import time
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, Union
 from pynput import keyboard as pynput_keyboard
 
 from . import state  # Changed from direct imports
+from .macro_format import Macro, load_json_events
 
 CONFIG_FILENAME = ".config"
+PROFILE_DATA_DIR = ".yasumi_profiles"
+# Profiles' macro recordings are kept out of .config, one .ymacro file per profile
+MACRO_SUFFIX = ".ymacro"
 
-def load_config() -> Dict[str, Any]:
-    config = {}
-    if os.path.isfile(CONFIG_FILENAME):
+
+def write_atomic(path: str, text: str) -> None:
+    """Write via a temp file and rename so readers never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ConfigStore:
+    """The .config file, parsed once and kept in memory.
+
+    The file is re-read only when it changes on disk. `load` hands out a
+    copy, so edits only take effect through `save`, which rewrites the file
+    only when the serialized content differs from what was last read or
+    written. Each profile's `key_recording` lives in its
+    own memory-mapped .ymacro file under PROFILE_DATA_DIR, opened on first
+    use; inline recordings (older .config files, imported profiles) are
+    converted and moved out when saved.
+    """
+
+    def __init__(self, path: str = CONFIG_FILENAME, profile_dir: str = PROFILE_DATA_DIR):
+        self.path = path
+        self.profile_dir = profile_dir
+        self._config: Optional[Dict[str, Any]] = None
+        self._written: Optional[str] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._macros: Dict[str, Macro] = {}
+        self._lock = threading.RLock()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
         try:
-            with open(CONFIG_FILENAME, "r") as f:
-                config = json.load(f)
-        except Exception as e:
-            print(f"Error loading config: {e}")
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self) -> Dict[str, Any]:
+        with self._lock:
+            signature = self._stat()
+            if self._config is not None and signature == self._signature:
+                return copy.deepcopy(self._config)
+            config: Dict[str, Any] = {}
+            if signature is not None:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        config = json.load(f)
+                    self._written = json.dumps(config, indent=4)
+                except Exception as e:
+                    print(f"Error loading config: {e}")
+            self._config = config
+            self._signature = signature
+            return copy.deepcopy(config)
+
+    def save(self, config: Dict[str, Any]) -> bool:
+        """Write `config` if it changed; returns whether the file was written."""
+        with self._lock:
+            self._extract_macros(config)
+            text = json.dumps(config, indent=4)
+            self._config = copy.deepcopy(config)
+            if text == self._written and self._signature == self._stat():
+                return False
+            try:
+                write_atomic(self.path, text)
+            except Exception as e:
+                print(f"Error saving config: {e}")
+                return False
+            self._written = text
+            self._signature = self._stat()
+            return True
+
+    def profile_path(self, profile: str, suffix: str) -> str:
+        # Profile names are free text: keep a readable slug, disambiguated by a hash
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", profile).strip("._")[:40] or "profile"
+        digest = hashlib.sha1(profile.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.profile_dir, f"{slug}-{digest}{suffix}")
+
+    def macro(self, profile: str) -> Macro:
+        """The profile's recording, memory-mapped on first use (empty if none)."""
+        with self._lock:
+            if profile not in self._macros:
+                macro = Macro.empty()
+                path = self.profile_path(profile, MACRO_SUFFIX)
+                legacy_path = self.profile_path(profile, ".key_recording.json")
+                try:
+                    if os.path.isfile(path):
+                        macro = Macro.open(path)
+                    elif os.path.isfile(legacy_path):
+                        # JSON event list written before the binary format
+                        self.set_macro(profile, Macro.from_events(load_json_events(legacy_path)))
+                        os.remove(legacy_path)
+                        return self._macros[profile]
+                except Exception as e:
+                    print(f"Error loading macro for profile '{profile}': {e}")
+                self._macros[profile] = macro
+            return self._macros[profile]
+
+    def set_macro(self, profile: str, macro: Macro) -> None:
+        with self._lock:
+            previous = self._macros.pop(profile, None)
+            if previous is not None:
+                # Windows refuses to replace a file that is still mapped; a macro
+                # that is playing stays mapped until its player releases it
+                previous.close()
+            try:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                macro.save(self.profile_path(profile, MACRO_SUFFIX))
+            except Exception as e:
+                print(f"Error saving macro for profile '{profile}': {e}")
+                return
+            self._macros[profile] = macro
+
+    def _extract_macros(self, config: Dict[str, Any]) -> None:
+        for name, profile in config.get("profiles", {}).items():
+            if isinstance(profile, dict) and "key_recording" in profile:
+                try:
+                    macro = Macro.from_events(profile["key_recording"])
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Keeping unreadable key_recording of profile '{name}' inline: {e}")
+                    continue
+                self.set_macro(name, macro)
+                del profile["key_recording"]
+
+
+config_store = ConfigStore()
+
+
+def load_config() -> Dict[str, Any]:
+    config = config_store.load()
     
     # Set defaults
     config.setdefault("stop_key", "esc")
     config.setdefault("matching_pattern", [False] * len(state.METHOD_NAMES))
     config.setdefault("mode", "performance")
     config.setdefault("accuracy_thresholds", state.DEFAULT_ACCURACY_THRESHOLDS.copy())
+    config.setdefault("template_pyramid", state.DEFAULT_TEMPLATE_PYRAMID.copy())
     config.setdefault("scan_duration", 0.5)
+    config.setdefault("scan_rate", 0.0)
+    config.setdefault("roi_search", state.DEFAULT_ROI_SETTINGS.copy())
+    config.setdefault("change_detection", state.DEFAULT_CHANGE_DETECTION.copy())
+    config.setdefault("executor", state.DEFAULT_EXECUTOR.copy())
+    config.setdefault("cascade", state.DEFAULT_CASCADE.copy())
+    config.setdefault("normalization", state.DEFAULT_NORMALIZATION.copy())
+    config.setdefault("template_cache", state.DEFAULT_TEMPLATE_CACHE.copy())
+    config.setdefault("metrics", state.DEFAULT_METRICS.copy())
+    config.setdefault("logging", state.DEFAULT_LOGGING.copy())
+    config.setdefault("macro_recording", state.DEFAULT_MACRO_RECORDING.copy())
+    config.setdefault("playback", state.DEFAULT_PLAYBACK.copy())
+    config.setdefault("input", state.DEFAULT_INPUT.copy())
     
     # Update global state
     state.MODE = config["mode"]
     state.ACCURACY_THRESHOLDS.update(config["accuracy_thresholds"])
+    state.TEMPLATE_PYRAMID.update(config["template_pyramid"])
     state.SCAN_DURATION = config["scan_duration"]
+    state.SCAN_RATE = config["scan_rate"]
+    state.ROI_SETTINGS.update(config["roi_search"])
+    state.CHANGE_DETECTION.update(config["change_detection"])
+    state.EXECUTOR.update(config["executor"])
+    state.CASCADE.update(config["cascade"])
+    state.NORMALIZATION.update(config["normalization"])
+    state.TEMPLATE_CACHE.update(config["template_cache"])
+    state.METRICS.update(config["metrics"])
+    state.LOGGING.update(config["logging"])
+    state.MACRO_RECORDING.update(config["macro_recording"])
+    state.PLAYBACK.update(config["playback"])
+    state.INPUT.update(config["input"])
     
     save_config(config)
     return config
 
 def save_config(config: Dict[str, Any]) -> None:
-    try:
-        with open(CONFIG_FILENAME, "w") as f:
-            json.dump(config, f, indent=4)
-    except Exception as e:
-        print(f"Error saving config: {e}")
+    config_store.save(config)
+
+def load_key_recording(profile: str) -> Macro:
+    return config_store.macro(profile)
+
+def save_key_recording(profile: str, recording: Union[Macro, List[Dict[str, Any]]]) -> None:
+    """Store a profile's macro; accepts a Macro or a JSON-layout event list."""
+    if not isinstance(recording, Macro):
+        recording = Macro.from_events(recording)
+    config_store.set_macro(profile, recording)
 
 def import_configuration():
     """Import configuration from another file"""
@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+import cv2
+import numpy as np
+
+# Windows whose per-pixel variance falls below this are treated as flat (score 0)
+FLAT_VARIANCE = 1e-2
+# Memory for cached template spectra (one padded-screen-sized float32 array each)
+TEMPLATE_SPECTRA_BUDGET = 256 * 1024 * 1024
+
+
+def spectrum_nbytes(shape: Tuple[int, ...]) -> int:
+    """Size of one cached template spectrum for a screen of `shape` (about 33 MB at 4K)."""
+    return cv2.getOptimalDFTSize(shape[0]) * cv2.getOptimalDFTSize(shape[1]) * np.dtype(np.float32).itemsize
+
+
+class ScreenSpectrum:
+    """One frame's DFT and window statistics, shared by every template correlated against it.
+
+    With the screen zero-padded to at least its own size, the "valid" part of
+    a circular correlation never wraps, so a single spectrum serves all
+    template sizes. TM_CCOEFF_NORMED is then
+
+        sum(T' * I) / sqrt(sum(T'^2) * (sum(I^2) - sum(I)^2 / n))
+
+    with T' the zero-mean template: the numerator comes from the spectrum
+    product and the window variance from box filters, computed once per
+    template size and shared by every template of that size.
+    """
+
+    def __init__(self, image: np.ndarray):
+        self.height, self.width = image.shape[:2]
+        self.dft_size = (cv2.getOptimalDFTSize(self.height), cv2.getOptimalDFTSize(self.width))
+        padded = np.zeros(self.dft_size, dtype=np.float32)
+        padded[:self.height, :self.width] = image
+        self.spectrum = cv2.dft(padded, flags=0)
+        # Centred on mid-gray to keep float32 window statistics precise
+        self.centered = image.astype(np.float32) - 128.0
+
+    def inverse_deviation(self, h: int, w: int) -> np.ndarray:
+        """1 / sqrt(sum((I - mean)^2)) over every h x w window, 0 for flat windows."""
+        rows, cols = self.height - h + 1, self.width - w + 1
+        # Window means with the anchor at the top-left, so [:rows, :cols] are the full windows
+        mean = cv2.boxFilter(self.centered, cv2.CV_32F, (w, h), anchor=(0, 0))[:rows, :cols]
+        mean_sq = cv2.sqrBoxFilter(self.centered, cv2.CV_32F, (w, h), anchor=(0, 0))[:rows, :cols]
+        variance = cv2.subtract(mean_sq, cv2.multiply(mean, mean))
+        flat = variance <= FLAT_VARIANCE
+        inverse = cv2.pow(cv2.max(variance, FLAT_VARIANCE), -0.5)
+        inverse *= 1.0 / np.sqrt(h * w)
+        inverse[flat] = 0.0
+        return inverse
+
+    def correlate(self, template_spectrum: np.ndarray, template_energy: float, inverse_deviation: np.ndarray) -> np.ndarray:
+        """TM_CCOEFF_NORMED map of shape (H - h + 1, W - w + 1) given the size's inverse_deviation()."""
+        rows, cols = inverse_deviation.shape
+        product = cv2.mulSpectrums(self.spectrum, template_spectrum, 0, conjB=True)
+        numerator = cv2.idft(product, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE, nonzeroRows=rows)[:rows, :cols]
+        result = cv2.multiply(numerator, inverse_deviation, scale=1.0 / np.sqrt(template_energy))
+        return np.clip(result, -1.0, 1.0, out=result)
+
+
+class TemplateSpectra:
+    """Zero-mean template spectra, computed once per (template, DFT size).
+
+    Each spectrum is as large as the padded screen, so the least recently
+    used ones are evicted past `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = TEMPLATE_SPECTRA_BUDGET):
+        self.max_bytes = max_bytes
+        self._spectra: "OrderedDict[Tuple[str, Tuple[int, int]], Tuple[np.ndarray, np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, template: np.ndarray, dft_size: Tuple[int, int]) -> Tuple[np.ndarray, float]:
+        cache_key = (key, dft_size)
+        with self._lock:
+            cached = self._spectra.get(cache_key)
+            # Holding the template keeps identity meaningful: a reload is a new array
+            if cached is not None and cached[0] is template:
+                self._spectra.move_to_end(cache_key)
+                return cached[1], cached[2]
+        h, w = template.shape[:2]
+        zero_mean = template.astype(np.float32) - float(template.mean())
+        padded = np.zeros(dft_size, dtype=np.float32)
+        padded[:h, :w] = zero_mean
+        spectrum, energy = cv2.dft(padded, flags=0), float(np.sum(zero_mean.astype(np.float64) ** 2))
+        with self._lock:
+            # A new screen size replaces older entries
+            for stale in [k for k in self._spectra if k[0] == key]:
+                self._bytes -= self._spectra.pop(stale)[1].nbytes
+            self._spectra[cache_key] = (template, spectrum, energy)
+            self._bytes += spectrum.nbytes
+            while self._bytes > self.max_bytes and len(self._spectra) > 1:
+                self._bytes -= self._spectra.popitem(last=False)[1][1].nbytes
+        return spectrum, energy
+
+    def fits(self, count: int, shape: Tuple[int, ...]) -> bool:
+        """Whether `count` spectra for a screen of `shape` stay cached together.
+
+        Past the budget every pass evicts and recomputes spectra, which is
+        slower than matching each template directly.
+        """
+        return count * spectrum_nbytes(shape) <= self.max_bytes
+
+    def retain(self, keys: Iterable[str]) -> None:
+        """Drop spectra (and the template arrays they pin) of templates not in `keys`."""
+        keep = set(keys)
+        with self._lock:
+            for cache_key in [k for k in self._spectra if k[0] not in keep]:
+                self._bytes -= self._spectra.pop(cache_key)[1].nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spectra.clear()
+            self._bytes = 0
+
+
+template_spectra = TemplateSpectra()
+
+
+def batch_match_template(spectrum: ScreenSpectrum, templates: Dict[str, np.ndarray]) -> Dict[str, Tuple[float, Tuple[int, int]]]:
+    """Best (score, top-left) per template against one screen spectrum.
+
+    Templates are grouped by size so each group computes its window statistics once.
+    """
+    groups: Dict[Tuple[int, int], List[str]] = {}
+    for key, template in templates.items():
+        h, w = template.shape[:2]
+        if h <= spectrum.height and w <= spectrum.width:
+            groups.setdefault((h, w), []).append(key)
+    results: Dict[str, Tuple[float, Tuple[int, int]]] = {}
+    for (h, w), keys in groups.items():
+        inverse_deviation = spectrum.inverse_deviation(h, w)
+        for key in keys:
+            template_spectrum, energy = template_spectra.get(key, templates[key], spectrum.dft_size)
+            if energy <= FLAT_VARIANCE:
+                continue
+            scores = spectrum.correlate(template_spectrum, energy, inverse_deviation)
+            _, max_val, _, max_loc = cv2.minMaxLoc(scores)
+            results[key] = (float(max_val), max_loc)
+    return results
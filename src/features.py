@@ -0,0 +1,340 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .utils import file_digest
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRNAME = ".yasumi_cache"
+
+# Detector construction parameters; part of the descriptor cache key so a
+# change here never serves descriptors computed with different settings.
+DETECTOR_PARAMS: Dict[str, Dict[str, Any]] = {
+    "orb": {"nfeatures": 2000, "scaleFactor": 1.2, "nlevels": 8, "edgeThreshold": 15, "patchSize": 31},
+    "sift": {},
+    "akaze": {},
+}
+
+_DETECTOR_FACTORIES = {
+    "orb": "ORB_create",
+    "sift": "SIFT_create",
+    "akaze": "AKAZE_create",
+}
+
+# SIFT descriptors are float vectors, ORB/AKAZE are binary strings
+DETECTOR_NORMS = {
+    "orb": cv2.NORM_HAMMING,
+    "sift": cv2.NORM_L2,
+    "akaze": cv2.NORM_HAMMING,
+}
+
+Features = Tuple[Tuple[cv2.KeyPoint, ...], Optional[np.ndarray]]
+
+
+def create_detector(name: str) -> Any:
+    factory = getattr(cv2, _DETECTOR_FACTORIES[name], None)
+    if factory is None:
+        raise RuntimeError(f"{name.upper()} not available in this OpenCV installation.")
+    return factory(**DETECTOR_PARAMS[name])
+
+
+class DetectorSlot:
+    """Long-lived detector plus per-thread brute-force matchers for one algorithm.
+
+    OpenCV feature detectors are not safe to drive from several threads at
+    once, so extraction goes through `detect_and_compute` under a lock.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.detector = create_detector(name)
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def detect_and_compute(self, image: np.ndarray) -> Features:
+        with self.lock:
+            keypoints, descriptors = self.detector.detectAndCompute(image, None)
+        return tuple(keypoints), descriptors
+
+    @property
+    def matcher(self) -> Any:
+        matcher = getattr(self._local, "matcher", None)
+        if matcher is None:
+            matcher = self._local.matcher = cv2.BFMatcher(DETECTOR_NORMS[self.name])
+        return matcher
+
+
+_slots: Dict[str, DetectorSlot] = {}
+_slots_lock = threading.Lock()
+
+
+def get_detector(name: str) -> DetectorSlot:
+    with _slots_lock:
+        slot = _slots.get(name)
+        if slot is None:
+            slot = _slots[name] = DetectorSlot(name)
+        return slot
+
+
+def frame_features(frame: Any, name: str) -> Features:
+    """Screen keypoints/descriptors for `frame`, extracted once per detector per frame."""
+    return frame.cached(("features", name), lambda: get_detector(name).detect_and_compute(frame.gray))
+
+
+def detector_signature(name: str) -> str:
+    params = json.dumps(DETECTOR_PARAMS[name], sort_keys=True)
+    digest = hashlib.sha1(f"{name}:{cv2.__version__}:{params}".encode()).hexdigest()[:8]
+    return f"{name}-{digest}"
+
+
+def _pack(keypoints: Tuple[cv2.KeyPoint, ...], descriptors: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+    return {
+        "pt": np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2),
+        "size": np.array([kp.size for kp in keypoints], dtype=np.float32),
+        "angle": np.array([kp.angle for kp in keypoints], dtype=np.float32),
+        "response": np.array([kp.response for kp in keypoints], dtype=np.float32),
+        "octave": np.array([kp.octave for kp in keypoints], dtype=np.int32),
+        "class_id": np.array([kp.class_id for kp in keypoints], dtype=np.int32),
+        "descriptors": descriptors if descriptors is not None else np.empty((0, 0), dtype=np.uint8),
+    }
+
+
+def _unpack(data: Any) -> Features:
+    keypoints = tuple(
+        cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+        for (x, y), size, angle, response, octave, class_id in zip(
+            data["pt"], data["size"], data["angle"], data["response"], data["octave"], data["class_id"]
+        )
+    )
+    descriptors = data["descriptors"]
+    return keypoints, (descriptors if descriptors.size else None)
+
+
+class DescriptorCache:
+    """Template keypoints/descriptors, memoized in memory and persisted as .npz.
+
+    Entries are keyed by (template path, file content hash, detector
+    signature). The on-disk copy lives in a `.yasumi_cache` folder next to the
+    template, so editing an image or changing detector parameters simply
+    misses the cache and recomputes.
+    """
+
+    def __init__(self, persist: bool = True):
+        self.persist = persist
+        self._memory: Dict[Tuple[str, str, str], Features] = {}
+        self._lock = threading.Lock()
+
+    def _disk_path(self, template_path: str, digest: str, signature: str) -> str:
+        folder = os.path.join(os.path.dirname(os.path.abspath(template_path)), CACHE_DIRNAME)
+        return os.path.join(folder, f"{os.path.basename(template_path)}.{signature}.{digest[:16]}.npz")
+
+    def get(self, name: str, template_path: str, template: np.ndarray) -> Features:
+        try:
+            digest = file_digest(template_path)
+        except OSError:
+            # Not backed by a readable file, key on the pixels instead
+            digest = hashlib.sha1(template.tobytes()).hexdigest()
+        signature = detector_signature(name)
+        key = (os.path.abspath(template_path), digest, signature)
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None:
+            return cached
+
+        features = self._load(template_path, digest, signature) if self.persist else None
+        if features is None:
+            features = get_detector(name).detect_and_compute(template)
+            if self.persist:
+                self._store(template_path, digest, signature, features)
+        with self._lock:
+            self._memory[key] = features
+        return features
+
+    def _load(self, template_path: str, digest: str, signature: str) -> Optional[Features]:
+        path = self._disk_path(template_path, digest, signature)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return _unpack(data)
+        except Exception as e:
+            logger.warning("Ignoring unreadable descriptor cache %s: %s", path, e)
+            return None
+
+    def retain(self, template_paths: List[str]) -> None:
+        """Forget in-memory features of templates not in `template_paths`; disk copies stay."""
+        keep = {os.path.abspath(path) for path in template_paths}
+        with self._lock:
+            for key in [k for k in self._memory if k[0] not in keep]:
+                del self._memory[key]
+
+    def _store(self, template_path: str, digest: str, signature: str, features: Features) -> None:
+        path = self._disk_path(template_path, digest, signature)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Drop entries for older versions of this image/detector
+            prefix = path[: -len(f"{digest[:16]}.npz")]
+            for stale in glob.glob(glob.escape(prefix) + "*.npz"):
+                if stale == path:
+                    continue
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass  # another worker process got there first
+            # A unique temp file per writer: worker processes may store the same template at once
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, **_pack(*features))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning("Could not persist descriptor cache for %s: %s", template_path, e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+
+descriptor_cache = DescriptorCache()
+
+
+def template_features(name: str, template_path: str, template: np.ndarray) -> Features:
+    return descriptor_cache.get(name, template_path, template)
+
+
+# FLANN index parameters: KD-trees for float descriptors, LSH for binary ones
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+FLANN_INDEX_PARAMS: Dict[str, Dict[str, Any]] = {
+    "orb": {"algorithm": FLANN_INDEX_LSH, "table_number": 6, "key_size": 12, "multi_probe_level": 1},
+    "sift": {"algorithm": FLANN_INDEX_KDTREE, "trees": 5},
+    "akaze": {"algorithm": FLANN_INDEX_LSH, "table_number": 6, "key_size": 12, "multi_probe_level": 1},
+}
+FLANN_SEARCH_PARAMS: Dict[str, Any] = {"checks": 50}
+
+# Neighbours fetched per screen descriptor; the ratio test needs the
+# second-closest descriptor *of the same template*, which may not be 2nd overall.
+INDEX_KNN = 4
+
+
+class DescriptorIndex:
+    """One FLANN index over the descriptors of a whole template library.
+
+    The screen descriptors are queried once against it and every surviving
+    correspondence is routed back to the template that owns the descriptor,
+    replacing one brute-force knnMatch per template.
+    """
+
+    def __init__(self, name: str, entries: List[Tuple[str, Features]]):
+        self.name = name
+        self.paths: List[str] = []
+        self.keypoints: List[Tuple[cv2.KeyPoint, ...]] = []
+        owners: List[np.ndarray] = []
+        locals_: List[np.ndarray] = []
+        descriptors: List[np.ndarray] = []
+        for path, (kps, des) in entries:
+            if des is None or len(des) == 0:
+                continue
+            owners.append(np.full(len(des), len(self.paths), dtype=np.int32))
+            locals_.append(np.arange(len(des), dtype=np.int32))
+            descriptors.append(des)
+            self.paths.append(path)
+            self.keypoints.append(kps)
+        self.owner = np.concatenate(owners) if owners else np.empty(0, dtype=np.int32)
+        self.local_index = np.concatenate(locals_) if locals_ else np.empty(0, dtype=np.int32)
+        self.matcher = None
+        self.lock = threading.Lock()
+        if descriptors:
+            library = np.vstack(descriptors)
+            if DETECTOR_NORMS[name] == cv2.NORM_L2:
+                library = library.astype(np.float32)
+            self.matcher = cv2.FlannBasedMatcher(FLANN_INDEX_PARAMS[name], FLANN_SEARCH_PARAMS)
+            self.matcher.add([library])
+            self.matcher.train()
+
+    def query(self, screen_features: Features, ratio: float = 0.7) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Return {template path: (template points, screen points)} after the ratio test."""
+        screen_kps, screen_des = screen_features
+        if self.matcher is None or screen_des is None or len(screen_des) < 2:
+            return {}
+        if DETECTOR_NORMS[self.name] == cv2.NORM_L2:
+            screen_des = screen_des.astype(np.float32)
+        k = min(INDEX_KNN, len(self.owner))
+        with self.lock:
+            knn = self.matcher.knnMatch(screen_des, k=k)
+        # LSH can return fewer than k neighbours; pad those rows with inf
+        distances = np.full((len(knn), k), np.inf, dtype=np.float32)
+        train_idx = np.zeros((len(knn), k), dtype=np.int64)
+        query_idx = np.arange(len(knn))
+        for row, neighbours in enumerate(knn):
+            for col, m in enumerate(neighbours):
+                distances[row, col] = m.distance
+                train_idx[row, col] = m.trainIdx
+        owners = self.owner[train_idx]
+        owners[np.isinf(distances)] = -1
+        best_owner = owners[:, 0]
+        same = owners[:, 1:] == best_owner[:, None]
+        has_second = same.any(axis=1)
+        second = np.where(
+            has_second,
+            distances[:, 1:][query_idx, np.argmax(same, axis=1)] if k > 1 else np.inf,
+            distances[:, -1] if k > 1 else np.inf,
+        )
+        good = (best_owner >= 0) & (distances[:, 0] < ratio * second)
+        # Keep only the closest screen descriptor per library descriptor so the
+        # correspondences stay one-to-one like a template->screen match
+        good_rows = np.nonzero(good)[0]
+        order = good_rows[np.argsort(distances[good_rows, 0], kind="stable")]
+        _, first = np.unique(train_idx[order, 0], return_index=True)
+        good = np.zeros_like(good)
+        good[order[first]] = True
+
+        results: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for owner in np.unique(best_owner[good]):
+            rows = np.nonzero(good & (best_owner == owner))[0]
+            template_kps = self.keypoints[owner]
+            local = self.local_index[train_idx[rows, 0]]
+            src_pts = np.float32([template_kps[i].pt for i in local]).reshape(-1, 1, 2)
+            dst_pts = np.float32([screen_kps[i].pt for i in rows]).reshape(-1, 1, 2)
+            results[self.paths[owner]] = (src_pts, dst_pts)
+        return results
+
+
+# One index per detector: switching template sets replaces it instead of accumulating
+_indexes: Dict[str, Tuple[Tuple[str, ...], List[Any], DescriptorIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def library_index(name: str, entries: List[Tuple[str, Features]]) -> DescriptorIndex:
+    """Return the index for this template set, rebuilding it when any template's features change."""
+    paths = tuple(path for path, _ in entries)
+    # Descriptor arrays are memoized by the descriptor cache, so identity tracks content
+    sources = [des for _, (_, des) in entries]
+    with _indexes_lock:
+        cached = _indexes.get(name)
+        if cached is not None and cached[0] == paths and all(a is b for a, b in zip(cached[1], sources)):
+            return cached[2]
+    index = DescriptorIndex(name, entries)
+    with _indexes_lock:
+        _indexes[name] = (paths, sources, index)
+    return index
+
+
+def retain_library_indexes(template_paths: List[str]) -> None:
+    """Drop indexes built over any template not in `template_paths`."""
+    keep = set(template_paths)
+    with _indexes_lock:
+        for name in [n for n, (paths, _, _) in _indexes.items() if not keep.issuperset(paths)]:
+            del _indexes[name]
@@ -0,0 +1,426 @@
+import abc
+import ctypes
+import logging
+import os
+import platform
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from . import state
+from .platform_utils import left_click
+
+try:
+    import pyautogui
+except Exception:  # no display (headless Linux)
+    pyautogui = None
+
+logger = logging.getLogger(__name__)
+
+# Raised by pyautogui when the pointer hits a screen corner; empty when pyautogui is missing
+FAILSAFE_EXCEPTIONS: Tuple[type, ...] = (pyautogui.FailSafeException,) if pyautogui is not None else ()
+
+
+def check_failsafe() -> None:
+    """Raise pyautogui's FailSafeException while the pointer sits in a fail-safe corner.
+
+    pyautogui runs this check before every call; backends that bypass it
+    run it before sending input so the emergency stop keeps working.
+    """
+    if pyautogui is not None and pyautogui.FAILSAFE:
+        pyautogui.failSafeCheck()
+
+
+def button_name(button: str) -> str:
+    """'Button.left' (pynput's str()) or 'left' -> 'left'."""
+    return button.rsplit(".", 1)[-1].lower()
+
+
+class InputBackend(abc.ABC):
+    """Base class for input injection.
+
+    Backends may queue events until `flush`, which sends everything queued
+    in as few native calls as the platform allows. Callers flush before
+    waiting, so queued input never sits behind a sleep. Subclasses must
+    implement every abstract method; an incomplete backend cannot be
+    instantiated.
+    """
+
+    @abc.abstractmethod
+    def key_down(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def key_up(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def move(self, x: int, y: int) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mouse_down(self, x: int, y: int, button: str = "left") -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mouse_up(self, x: int, y: int, button: str = "left") -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def scroll(self, x: int, y: int, clicks: int) -> None:
+        raise NotImplementedError
+
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        self.move(x, y)
+        self.mouse_down(x, y, button)
+        self.mouse_up(x, y, button)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class InputEvent(NamedTuple):
+    time: float
+    action: str
+    args: Tuple
+
+
+class RecordingBackend(InputBackend):
+    """Captures input as timestamped events instead of sending it, for headless runs and tests.
+
+    `flushes` counts flush calls; `batches` holds the event count at each
+    flush, so batch boundaries can be checked too.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.events: List[InputEvent] = []
+        self.batches: List[int] = []
+        self.flushes = 0
+        self._lock = threading.Lock()
+
+    def _record(self, action: str, *args) -> None:
+        with self._lock:
+            self.events.append(InputEvent(self.clock(), action, args))
+
+    def key_down(self, key: str) -> None:
+        self._record("key_down", key)
+
+    def key_up(self, key: str) -> None:
+        self._record("key_up", key)
+
+    def move(self, x: int, y: int) -> None:
+        self._record("move", x, y)
+
+    def mouse_down(self, x: int, y: int, button: str = "left") -> None:
+        self._record("mouse_down", x, y, button)
+
+    def mouse_up(self, x: int, y: int, button: str = "left") -> None:
+        self._record("mouse_up", x, y, button)
+
+    def scroll(self, x: int, y: int, clicks: int) -> None:
+        self._record("scroll", x, y, clicks)
+
+    def flush(self) -> None:
+        with self._lock:
+            self.flushes += 1
+            self.batches.append(len(self.events))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.events.clear()
+            self.batches.clear()
+            self.flushes = 0
+
+
+class PyAutoGUIBackend(InputBackend):
+    """One library call per event, without pyautogui's default 0.1s pause (fallback everywhere)."""
+
+    def __init__(self):
+        if pyautogui is None:
+            raise RuntimeError("pyautogui is not available for input injection.")
+
+    def key_down(self, key: str) -> None:
+        pyautogui.keyDown(key, _pause=False)
+
+    def key_up(self, key: str) -> None:
+        pyautogui.keyUp(key, _pause=False)
+
+    def move(self, x: int, y: int) -> None:
+        pyautogui.moveTo(x, y, _pause=False)
+
+    def mouse_down(self, x: int, y: int, button: str = "left") -> None:
+        pyautogui.mouseDown(x, y, button=button, _pause=False)
+
+    def mouse_up(self, x: int, y: int, button: str = "left") -> None:
+        pyautogui.mouseUp(x, y, button=button, _pause=False)
+
+    def scroll(self, x: int, y: int, clicks: int) -> None:
+        pyautogui.scroll(clicks, x=x, y=y, _pause=False)
+
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        if button == "left":
+            # Quartz events on macOS, see platform_utils
+            left_click(x, y)
+        else:
+            pyautogui.click(x, y, button=button, _pause=False)
+
+
+# Virtual-key codes for pynput key names; single characters go through VkKeyScanW
+NAMED_VK: Dict[str, int] = {
+    "backspace": 0x08, "tab": 0x09, "enter": 0x0D, "shift": 0x10, "ctrl": 0x11, "alt": 0x12,
+    "pause": 0x13, "caps_lock": 0x14, "esc": 0x1B, "space": 0x20, "page_up": 0x21, "page_down": 0x22,
+    "end": 0x23, "home": 0x24, "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+    "print_screen": 0x2C, "insert": 0x2D, "delete": 0x2E, "cmd": 0x5B, "cmd_l": 0x5B, "cmd_r": 0x5C,
+    "menu": 0x5D, "num_lock": 0x90, "scroll_lock": 0x91, "shift_l": 0xA0, "shift_r": 0xA1,
+    "ctrl_l": 0xA2, "ctrl_r": 0xA3, "alt_l": 0xA4, "alt_r": 0xA5, "alt_gr": 0xA5,
+    **{f"f{i}": 0x6F + i for i in range(1, 25)},
+}
+# Keys whose scan codes need KEYEVENTF_EXTENDEDKEY
+EXTENDED_VK = {0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28, 0x2C, 0x2D, 0x2E, 0x5B, 0x5C, 0x5D, 0x90, 0xA3, 0xA5}
+
+MOUSE_BUTTON_FLAGS = {"left": (0x0002, 0x0004), "right": (0x0008, 0x0010), "middle": (0x0020, 0x0040)}
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_WHEEL = 0x0800
+MOUSEEVENTF_ABSOLUTE = 0x8000
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+WHEEL_DELTA = 120
+
+
+class SendInputBackend(InputBackend):
+    """Windows: queues INPUT records and sends each batch with a single SendInput call.
+
+    Keys are sent as scan codes, like pydirectinput, so games reading
+    DirectInput see them.
+    """
+
+    def __init__(self):
+        from .platform_utils import INPUT, KEYBDINPUT, MOUSEINPUT, SendInput
+        self._INPUT, self._KEYBDINPUT, self._MOUSEINPUT, self._send = INPUT, KEYBDINPUT, MOUSEINPUT, SendInput
+        user32 = ctypes.windll.user32
+        user32.VkKeyScanW.restype = ctypes.c_short
+        self._user32 = user32
+        self._width = max(user32.GetSystemMetrics(0), 2)
+        self._height = max(user32.GetSystemMetrics(1), 2)
+        self._scan_codes: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._pending: List = []
+        self._lock = threading.Lock()
+
+    def _scan_code(self, key: str) -> Optional[Tuple[int, int]]:
+        if key not in self._scan_codes:
+            name = key.lower()
+            vk = NAMED_VK.get(name)
+            if vk is None and len(key) == 1:
+                scanned = self._user32.VkKeyScanW(ord(name))
+                vk = scanned & 0xFF if scanned != -1 and scanned & 0xFF != 0xFF else None
+            if vk is None:
+                logger.warning("No virtual-key code for %r; key ignored.", key)
+                self._scan_codes[key] = None
+            else:
+                flags = KEYEVENTF_SCANCODE | (KEYEVENTF_EXTENDEDKEY if vk in EXTENDED_VK else 0)
+                self._scan_codes[key] = (self._user32.MapVirtualKeyW(vk, 0), flags)
+        return self._scan_codes[key]
+
+    def _key(self, key: str, up: bool) -> None:
+        code = self._scan_code(key)
+        if code is None:
+            return
+        scan, flags = code
+        inp = self._INPUT(type=1)
+        inp.ki = self._KEYBDINPUT(wVk=0, wScan=scan, dwFlags=flags | (KEYEVENTF_KEYUP if up else 0),
+                                  time=0, dwExtraInfo=None)
+        with self._lock:
+            self._pending.append(inp)
+
+    def _mouse(self, x: int, y: int, flags: int, data: int = 0) -> None:
+        inp = self._INPUT(type=0)
+        inp.mi = self._MOUSEINPUT(
+            dx=int(x * 65535 / (self._width - 1)), dy=int(y * 65535 / (self._height - 1)),
+            mouseData=data & 0xFFFFFFFF, dwFlags=flags | MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE,
+            time=0, dwExtraInfo=None,
+        )
+        with self._lock:
+            self._pending.append(inp)
+
+    def key_down(self, key: str) -> None:
+        self._key(key, up=False)
+
+    def key_up(self, key: str) -> None:
+        self._key(key, up=True)
+
+    def move(self, x: int, y: int) -> None:
+        self._mouse(x, y, 0)
+
+    def mouse_down(self, x: int, y: int, button: str = "left") -> None:
+        self._mouse(x, y, MOUSE_BUTTON_FLAGS.get(button, MOUSE_BUTTON_FLAGS["left"])[0])
+
+    def mouse_up(self, x: int, y: int, button: str = "left") -> None:
+        self._mouse(x, y, MOUSE_BUTTON_FLAGS.get(button, MOUSE_BUTTON_FLAGS["left"])[1])
+
+    def scroll(self, x: int, y: int, clicks: int) -> None:
+        self._mouse(x, y, MOUSEEVENTF_WHEEL, clicks * WHEEL_DELTA)
+
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        # Button records carry the position, no separate move needed
+        self.mouse_down(x, y, button)
+        self.mouse_up(x, y, button)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # The batch is already dequeued, so a fail-safe abort drops it
+        check_failsafe()
+        records = (self._INPUT * len(batch))(*batch)
+        sent = self._send(len(batch), records, ctypes.sizeof(self._INPUT))
+        if sent != len(batch):
+            logger.warning("SendInput injected %d of %d events (blocked by UIPI?).", sent, len(batch))
+
+
+# pynput key names -> X keysym names; single characters map to their Latin-1/Unicode keysym
+NAMED_KEYSYMS: Dict[str, str] = {
+    "enter": "Return", "esc": "Escape", "space": "space", "tab": "Tab", "backspace": "BackSpace",
+    "shift": "Shift_L", "shift_l": "Shift_L", "shift_r": "Shift_R", "ctrl": "Control_L",
+    "ctrl_l": "Control_L", "ctrl_r": "Control_R", "alt": "Alt_L", "alt_l": "Alt_L", "alt_r": "Alt_R",
+    "alt_gr": "ISO_Level3_Shift", "cmd": "Super_L", "cmd_l": "Super_L", "cmd_r": "Super_R",
+    "caps_lock": "Caps_Lock", "delete": "Delete", "insert": "Insert", "home": "Home", "end": "End",
+    "page_up": "Prior", "page_down": "Next", "up": "Up", "down": "Down", "left": "Left", "right": "Right",
+    "menu": "Menu", "num_lock": "Num_Lock", "scroll_lock": "Scroll_Lock", "pause": "Pause",
+    "print_screen": "Print",
+    **{f"f{i}": f"F{i}" for i in range(1, 25)},
+}
+X_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+
+class XTestBackend(InputBackend):
+    """X11: queues XTest fake-input requests and sends each batch with one flush.
+
+    Requests are kept until `flush`, so a batch refused by the fail-safe
+    check is dropped rather than left in Xlib's output buffer.
+    """
+
+    def __init__(self):
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self._X, self._XK, self._xtest = X, XK, xtest
+        self._display = display.Display()
+        if not self._display.has_extension("XTEST"):
+            raise RuntimeError("The X server has no XTEST extension.")
+        self._keycodes: Dict[str, Optional[int]] = {}
+        self._pending: List[Tuple[Tuple[int, int], Dict[str, int]]] = []
+        self._lock = threading.Lock()
+
+    def _keycode(self, key: str) -> Optional[int]:
+        if key not in self._keycodes:
+            name = NAMED_KEYSYMS.get(key.lower())
+            if name is not None:
+                keysym = self._XK.string_to_keysym(name)
+            elif len(key) == 1:
+                keysym = ord(key) if ord(key) < 0x100 else 0x01000000 + ord(key)
+            else:
+                keysym = self._XK.string_to_keysym(key)
+            keycode = self._display.keysym_to_keycode(keysym) if keysym else 0
+            if not keycode:
+                logger.warning("No X keycode for %r; key ignored.", key)
+            self._keycodes[key] = keycode or None
+        return self._keycodes[key]
+
+    def _fake(self, event_type: int, detail: int = 0, x: Optional[int] = None, y: Optional[int] = None) -> None:
+        with self._lock:
+            self._pending.append(((event_type, detail), {} if x is None else {"x": x, "y": y}))
+
+    def key_down(self, key: str) -> None:
+        keycode = self._keycode(key)
+        if keycode is not None:
+            self._fake(self._X.KeyPress, keycode)
+
+    def key_up(self, key: str) -> None:
+        keycode = self._keycode(key)
+        if keycode is not None:
+            self._fake(self._X.KeyRelease, keycode)
+
+    def move(self, x: int, y: int) -> None:
+        self._fake(self._X.MotionNotify, x=x, y=y)
+
+    def mouse_down(self, x: int, y: int, button: str = "left") -> None:
+        self.move(x, y)
+        self._fake(self._X.ButtonPress, X_BUTTONS.get(button, 1))
+
+    def mouse_up(self, x: int, y: int, button: str = "left") -> None:
+        self.move(x, y)
+        self._fake(self._X.ButtonRelease, X_BUTTONS.get(button, 1))
+
+    def scroll(self, x: int, y: int, clicks: int) -> None:
+        self.move(x, y)
+        wheel = 4 if clicks > 0 else 5
+        for _ in range(abs(clicks)):
+            self._fake(self._X.ButtonPress, wheel)
+            self._fake(self._X.ButtonRelease, wheel)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            check_failsafe()
+            for args, position in batch:
+                self._xtest.fake_input(self._display, *args, **position)
+            self._display.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._display.close()
+
+
+def create_input_backend(name: str) -> InputBackend:
+    name = name.lower()
+    if name == "recording":
+        return RecordingBackend()
+    if name == "sendinput":
+        return SendInputBackend()
+    if name == "xtest":
+        return XTestBackend()
+    if name == "pyautogui":
+        return PyAutoGUIBackend()
+    if name != "auto":
+        logger.error("Unknown input backend %r; using 'auto'.", name)
+    system = platform.system()
+    if system == "Windows":
+        return SendInputBackend()
+    if system == "Linux" and os.environ.get("DISPLAY"):
+        try:
+            return XTestBackend()
+        except Exception as e:
+            logger.warning("XTest input unavailable (%s); falling back to pyautogui.", e)
+    return PyAutoGUIBackend()
+
+
+_input_backend: Optional[InputBackend] = None
+_input_backend_lock = threading.Lock()
+
+
+def get_input_backend() -> InputBackend:
+    """Return the active input backend, creating the configured one on first use.
+
+    Setting YASUMI_INPUT_BACKEND (e.g. to "recording") overrides the config.
+    """
+    global _input_backend
+    with _input_backend_lock:
+        if _input_backend is None:
+            name = os.environ.get("YASUMI_INPUT_BACKEND") or state.INPUT.get("backend", "auto")
+            _input_backend = create_input_backend(name)
+        return _input_backend
+
+
+def set_input_backend(backend: Optional[InputBackend]) -> None:
+    global _input_backend
+    with _input_backend_lock:
+        if _input_backend is not None and _input_backend is not backend:
+            _input_backend.close()
+        _input_backend = backend
@@ -0,0 +1,86 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from . import state
+
+Region = Tuple[int, int, int, int]  # x0, y0, x1, y1 (exclusive)
+
+
+class LocationMemory:
+    """Remembers where each template was last found so the next scan can look there first.
+
+    `search_region` hands out a padded box around the last hit; every
+    `full_scan_interval` scans it returns None to force a full-screen pass so
+    a second on-screen instance is not missed forever.
+    """
+
+    def __init__(self):
+        self._hits: Dict[str, Region] = {}
+        self._scans_since_full: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def search_region(self, template_path: str, screen_size: Tuple[int, int]) -> Optional[Region]:
+        if not state.ROI_SETTINGS.get("enabled", True):
+            return None
+        with self._lock:
+            hit = self._hits.get(template_path)
+            if hit is None:
+                return None
+            scans = self._scans_since_full.get(template_path, 0) + 1
+            interval = int(state.ROI_SETTINGS.get("full_scan_interval", 10))
+            if interval > 0 and scans >= interval:
+                self._scans_since_full[template_path] = 0
+                return None
+            self._scans_since_full[template_path] = scans
+        return self._padded(hit, screen_size)
+
+    def full_scan_due(self, template_path: str) -> bool:
+        """Whether the next search_region call would force a full-screen pass (no side effects)."""
+        interval = int(state.ROI_SETTINGS.get("full_scan_interval", 10))
+        with self._lock:
+            if template_path not in self._hits:
+                return False
+            return interval > 0 and self._scans_since_full.get(template_path, 0) + 1 >= interval
+
+    def skip(self, template_path: str) -> None:
+        """Count a scan that reused the last result, so periodic full scans still come due."""
+        with self._lock:
+            if template_path in self._hits:
+                self._scans_since_full[template_path] = self._scans_since_full.get(template_path, 0) + 1
+
+    def search_area(self, template_path: str, screen_size: Tuple[int, int]) -> Optional[Region]:
+        """Area the next scan would look at first, None meaning the whole screen (no side effects)."""
+        hit = self.last_hit(template_path)
+        return self._padded(hit, screen_size) if hit is not None else None
+
+    def _padded(self, hit: Region, screen_size: Tuple[int, int]) -> Optional[Region]:
+        pad = int(state.ROI_SETTINGS.get("padding", 64))
+        width, height = screen_size
+        x0, y0, x1, y1 = hit
+        region = (max(0, x0 - pad), max(0, y0 - pad), min(width, x1 + pad), min(height, y1 + pad))
+        if region[2] <= region[0] or region[3] <= region[1]:
+            return None
+        return region
+
+    def remember(self, template_path: str, center: Tuple[int, int], template_size: Tuple[int, int]) -> None:
+        w, h = template_size
+        x, y = center
+        with self._lock:
+            self._hits[template_path] = (x - w // 2, y - h // 2, x + (w + 1) // 2, y + (h + 1) // 2)
+
+    def last_hit(self, template_path: str) -> Optional[Region]:
+        with self._lock:
+            return self._hits.get(template_path)
+
+    def forget(self, template_path: str) -> None:
+        with self._lock:
+            self._hits.pop(template_path, None)
+            self._scans_since_full.pop(template_path, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hits.clear()
+            self._scans_since_full.clear()
+
+
+location_memory = LocationMemory()
@@ -0,0 +1,192 @@
+import atexit
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from . import state
+
+# Between INFO and WARNING: match hits and clicks, kept by the "production" level
+HIT = 25
+logging.addLevelName(HIT, "HIT")
+
+LOG_LEVELS = {
+    "production": HIT,  # hits, clicks, warnings and errors only
+    "info": logging.INFO,
+    "debug": logging.DEBUG,  # every method attempt, per template and cycle
+}
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_lock = threading.Lock()
+
+
+def log_level(level: Union[str, int, None] = None) -> int:
+    """Resolve a configured level name ("production", "info", "debug" or a stdlib name)."""
+    if level is None:
+        level = state.LOGGING.get("level", "production")
+    if isinstance(level, int):
+        return level
+    name = str(level).lower()
+    if name in LOG_LEVELS:
+        return LOG_LEVELS[name]
+    resolved = logging.getLevelName(name.upper())
+    if isinstance(resolved, int):
+        return resolved
+    logging.getLogger(__name__).error("Unknown log level %r; using 'production'.", level)
+    return HIT
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueues records untouched so message formatting happens on the listener thread.
+
+    The stock QueueHandler formats in the caller to make records picklable; the
+    listener lives in this process, so that work can move off the hot path.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RepeatFilter(logging.Filter):
+    """Samples identical records (same call site and arguments) to one per `window` seconds.
+
+    A capture or matcher error repeated every cycle would otherwise flood the
+    queue; the next record let through reports how many copies were dropped.
+    Hits and debug records are never sampled: debug output is expected to
+    repeat per template and cycle.
+    """
+
+    def __init__(self, window: float):
+        super().__init__()
+        self.window = window
+        self._seen: Dict[Tuple[Any, ...], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno == HIT or record.levelno < logging.INFO:
+            return True
+        try:
+            key = (record.name, record.lineno, record.msg, record.args)
+            hash(key)
+        except TypeError:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (None, 0))
+            if last is not None and now - last < self.window:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            if len(self._seen) > 1024:
+                self._seen.clear()
+            self._seen[key] = (now, 0)
+        if suppressed and isinstance(record.args, tuple):
+            if record.args:
+                record.msg = f"{record.msg} (%d similar suppressed)"
+                record.args = record.args + (suppressed,)
+            else:
+                record.msg = f"{record.msg} ({suppressed} similar suppressed)"
+        return True
+
+
+def configure_logging(level: Union[str, int, None] = None, extra_handlers: Iterable[logging.Handler] = ()) -> None:
+    """Route all records through a queue drained by a background writer thread.
+
+    Callers only pay for the level check and an enqueue; formatting, the rotating
+    log file, the optional console stream and `extra_handlers` run on the listener.
+    Calling again replaces the previous configuration.
+    """
+    global _listener, _queue_handler
+    settings = state.LOGGING
+    handlers = [
+        RotatingFileHandler(
+            settings.get("file", "debug.log"),
+            maxBytes=int(settings.get("max_bytes", 2 * 1024 * 1024)),
+            backupCount=int(settings.get("backup_count", 5)),
+            encoding='utf-8',
+            delay=True
+        )
+    ]
+    if settings.get("console", False):
+        handlers.append(logging.StreamHandler())
+    handlers.extend(extra_handlers)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+
+    with _lock:
+        _stop_locked()
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _queue_handler = _DeferredQueueHandler(records)
+        window = float(settings.get("repeat_window", 1.0))
+        if window > 0:
+            _queue_handler.addFilter(RepeatFilter(window))
+        _listener = QueueListener(records, *handlers, respect_handler_level=True)
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(_queue_handler)
+        root.setLevel(log_level(level))
+        _listener.start()
+    logging.captureWarnings(True)
+
+
+def _stop_locked() -> None:
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    # Flushes everything already queued before the handlers are closed
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+
+
+class _ForwardHandler(logging.Handler):
+    """Hands records from worker processes to this process's loggers (and their queue handler)."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def forward_worker_logs() -> Tuple["multiprocessing.Queue[logging.LogRecord]", QueueListener]:
+    """A queue for worker processes to log into, plus the started listener draining it here.
+
+    Pass the queue to `configure_worker_logging` in the worker initializer
+    and stop the listener when the workers are gone.
+    """
+    records: "multiprocessing.Queue[logging.LogRecord]" = multiprocessing.Queue()
+    listener = QueueListener(records, _ForwardHandler())
+    listener.start()
+    return records, listener
+
+
+def configure_worker_logging(records: "multiprocessing.Queue[logging.LogRecord]", level: int) -> None:
+    """Worker side of `forward_worker_logs`: send every record at `level` or above to the parent.
+
+    The stock QueueHandler formats records before enqueueing, so they pickle.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+
+
+def stop_logging() -> None:
+    """Drain the queue and close the handlers; records logged afterwards use logging's fallback."""
+    with _lock:
+        _stop_locked()
+
+
+atexit.register(stop_logging)
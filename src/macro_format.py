@@ -0,0 +1,381 @@
+"""Columnar binary macro recordings (.ymacro) and offline tools for them.
+
+Layout (little endian), every column 8-byte aligned:
+
+    header   magic "YMAC", version u16, flags u16, event count u64, string table bytes u64
+    strings  JSON list of interned key/button names, padded to 8 bytes
+    time     float64[count]   seconds since the recording started
+    x, y     int32[count]     pointer position (0 for key events)
+    a        int32[count]     key/button string index, or scroll dx
+    b        int32[count]     pressed flag for clicks, or scroll dy
+    type     uint8[count]     EVENT_TYPES index
+
+Files are memory-mapped read-only, so playback touches only the pages it
+iterates and never builds a dict per event. Usage:
+
+    python -m src.macro_format import events.json out.ymacro
+    python -m src.macro_format export in.ymacro events.json
+    python -m src.macro_format simplify in.ymacro out.ymacro --tolerance 1 --min-interval 0.004
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import state
+
+MAGIC = b"YMAC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQ")
+
+EVENT_TYPES = ("key_press", "key_release", "mouse_move", "mouse_click", "mouse_scroll")
+KEY_PRESS, KEY_RELEASE, MOUSE_MOVE, MOUSE_CLICK, MOUSE_SCROLL = range(len(EVENT_TYPES))
+
+# Stored in this order so every column stays aligned to its item size
+COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ("time", np.float64),
+    ("x", np.int32),
+    ("y", np.int32),
+    ("a", np.int32),
+    ("b", np.int32),
+    ("type", np.uint8),
+)
+
+Row = Tuple[int, float, int, int, int, int]  # (type, time, x, y, a, b)
+
+
+def _padded(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class Macro:
+    """A recording as parallel columns plus an interned string table."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], strings: List[str], mapping: Optional[mmap.mmap] = None):
+        self.columns = columns
+        self.strings = strings
+        self._mmap = mapping
+        self._users = 0
+        self._close_pending = False
+        self._users_lock = threading.Lock()
+
+    @classmethod
+    def empty(cls) -> "Macro":
+        return cls({name: np.zeros(0, dtype) for name, dtype in COLUMNS}, [])
+
+    @classmethod
+    def from_events(cls, events: List[Dict[str, Any]]) -> "Macro":
+        """Import the JSON layout: a list of {"type": ..., "time": ..., ...} dicts."""
+        recorder = MacroRecorder()
+        for event in events:
+            kind, t = event.get("type"), float(event.get("time", 0.0))
+            if kind in ("key_press", "key_release"):
+                recorder.key(kind == "key_press", str(event["key"]), t)
+            elif kind == "mouse_move":
+                recorder.move(event["x"], event["y"], t)
+            elif kind == "mouse_click":
+                recorder.click(event["x"], event["y"], str(event.get("button", "Button.left")),
+                               bool(event.get("pressed", True)), t)
+            elif kind == "mouse_scroll":
+                recorder.scroll(event["x"], event["y"], event.get("dx", 0), event.get("dy", 0), t)
+            else:
+                raise ValueError(f"Unknown macro event type: {kind!r}")
+        return recorder.build()
+
+    @classmethod
+    def open(cls, path: str) -> "Macro":
+        """Memory-map a .ymacro file; columns are read-only views into the mapping."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a macro file")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _flags, count, strings_size = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC or version != VERSION:
+            mapping.close()
+            raise ValueError(f"{path} is not a version {VERSION} macro file")
+        offset = HEADER.size
+        strings = json.loads(bytes(mapping[offset:offset + strings_size]).decode("utf-8"))
+        offset += _padded(strings_size)
+        columns: Dict[str, np.ndarray] = {}
+        for name, dtype in COLUMNS:
+            columns[name] = np.frombuffer(mapping, dtype=dtype, count=count, offset=offset)
+            offset += _padded(count * np.dtype(dtype).itemsize)
+        return cls(columns, strings, mapping)
+
+    def save(self, path: str) -> None:
+        """Write atomically (temp file + rename)."""
+        strings = json.dumps(self.strings).encode("utf-8")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(self), len(strings)))
+            f.write(strings.ljust(_padded(len(strings)), b"\0"))
+            for name, dtype in COLUMNS:
+                data = np.ascontiguousarray(self.columns[name], dtype=dtype).tobytes()
+                f.write(data.ljust(_padded(len(data)), b"\0"))
+        os.replace(tmp_path, path)
+
+    def acquire(self) -> None:
+        """Mark the macro in use (e.g. by a player), so close() waits for release()."""
+        with self._users_lock:
+            self._users += 1
+
+    def release(self) -> None:
+        with self._users_lock:
+            self._users -= 1
+            pending = self._users == 0 and self._close_pending
+        if pending:
+            self.close()
+
+    def close(self) -> None:
+        """Release the mapping; deferred while acquired, a no-op while column views are alive."""
+        with self._users_lock:
+            if self._users:
+                self._close_pending = True
+                return
+            self._close_pending = False
+        if self._mmap is None:
+            return
+        self.columns = {name: np.zeros(0, dtype) for name, dtype in COLUMNS}
+        try:
+            self._mmap.close()
+            self._mmap = None
+        except BufferError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.columns["time"])
+
+    def take(self, keep: np.ndarray) -> "Macro":
+        """A new in-memory macro with only the events where `keep` is true."""
+        return Macro({name: np.ascontiguousarray(column[keep]) for name, column in self.columns.items()},
+                     list(self.strings))
+
+    @property
+    def duration(self) -> float:
+        return float(self.columns["time"][-1]) if len(self) else 0.0
+
+    def rows(self, chunk: int = 4096) -> Iterator[Row]:
+        """Yield (type, time, x, y, a, b) tuples, converting `chunk` events at a time."""
+        c = self.columns
+        for start in range(0, len(self), chunk):
+            end = start + chunk
+            yield from zip(
+                c["type"][start:end].tolist(), c["time"][start:end].tolist(),
+                c["x"][start:end].tolist(), c["y"][start:end].tolist(),
+                c["a"][start:end].tolist(), c["b"][start:end].tolist(),
+            )
+
+    def to_events(self) -> List[Dict[str, Any]]:
+        """Export to the JSON layout."""
+        events: List[Dict[str, Any]] = []
+        for kind, t, x, y, a, b in self.rows():
+            if kind in (KEY_PRESS, KEY_RELEASE):
+                events.append({"type": EVENT_TYPES[kind], "key": self.strings[a], "time": t})
+            elif kind == MOUSE_MOVE:
+                events.append({"type": "mouse_move", "x": x, "y": y, "time": t})
+            elif kind == MOUSE_CLICK:
+                events.append({"type": "mouse_click", "x": x, "y": y, "button": self.strings[a],
+                               "pressed": bool(b), "time": t})
+            else:
+                events.append({"type": "mouse_scroll", "x": x, "y": y, "dx": a, "dy": b, "time": t})
+        return events
+
+
+class MacroRecorder:
+    """Appends events straight into typed columns; safe to feed from several listener threads."""
+
+    def __init__(self):
+        self._time = array("d")
+        self._x, self._y, self._a, self._b = array("i"), array("i"), array("i"), array("i")
+        self._type = array("B")
+        self._strings: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._time)
+
+    def _intern(self, text: str) -> int:
+        index = self._index.get(text)
+        if index is None:
+            index = self._index[text] = len(self._strings)
+            self._strings.append(text)
+        return index
+
+    def _append(self, kind: int, t: float, x: int, y: int, a: int, b: int) -> None:
+        self._type.append(kind)
+        self._time.append(t)
+        self._x.append(int(x))
+        self._y.append(int(y))
+        self._a.append(int(a))
+        self._b.append(int(b))
+
+    def key(self, pressed: bool, key: str, t: float) -> None:
+        with self._lock:
+            self._append(KEY_PRESS if pressed else KEY_RELEASE, t, 0, 0, self._intern(key), 0)
+
+    def move(self, x: int, y: int, t: float) -> None:
+        with self._lock:
+            self._append(MOUSE_MOVE, t, x, y, 0, 0)
+
+    def click(self, x: int, y: int, button: str, pressed: bool, t: float) -> None:
+        with self._lock:
+            self._append(MOUSE_CLICK, t, x, y, self._intern(button), int(pressed))
+
+    def scroll(self, x: int, y: int, dx: int, dy: int, t: float) -> None:
+        with self._lock:
+            self._append(MOUSE_SCROLL, t, x, y, dx, dy)
+
+    def build(self) -> Macro:
+        with self._lock:
+            sources = {"time": self._time, "x": self._x, "y": self._y, "a": self._a, "b": self._b, "type": self._type}
+            columns = {name: np.array(sources[name], dtype=dtype) for name, dtype in COLUMNS}
+            return Macro(columns, list(self._strings))
+
+
+def _path_keep(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Ramer-Douglas-Peucker over one pointer path; the mask of points to keep.
+
+    Uses the distance to the chord segment (not the infinite line) so a path
+    that doubles back on itself keeps its turning point.
+    """
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        length2 = dx * dx + dy * dy
+        if length2 > 0:
+            t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+            px, py = px - t * dx, py - t * dy
+        distance = np.hypot(px, py)
+        i = int(np.argmax(distance))
+        if distance[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def _spaced(times: np.ndarray, keep: np.ndarray, min_interval: float) -> np.ndarray:
+    """Drop kept interior points closer than `min_interval` to the previous kept one."""
+    kept = np.flatnonzero(keep)
+    last = times[kept[0]]
+    for i in kept[1:-1].tolist():
+        if times[i] - last < min_interval:
+            keep[i] = False
+        else:
+            last = times[i]
+    return keep
+
+
+def _filled(times: np.ndarray, keep: np.ndarray, max_interval: float) -> np.ndarray:
+    """Keep extra points so the gap between kept moves stays within `max_interval` where samples allow.
+
+    RDP only looks at the shape of a path: a straight drag would otherwise
+    keep just its ends, and playback would hold the pointer still and then
+    jump.
+    """
+    t, kept = times.tolist(), keep.tolist()
+    last = t[0]
+    for i in range(1, len(t)):
+        if kept[i]:
+            last = t[i]
+        elif t[i + 1] - last > max_interval:
+            keep[i] = True
+            last = t[i]
+    return keep
+
+
+def simplify_mouse_paths(macro: Macro, tolerance: float, min_interval: float = 0.0,
+                         max_interval: float = 0.0) -> Macro:
+    """Thin out runs of consecutive mouse moves.
+
+    Each run between two non-move events is reduced with RDP at `tolerance`
+    pixels, then kept moves closer than `min_interval` seconds are dropped,
+    then moves are put back wherever a gap would exceed `max_interval`, so
+    the pointer still follows the recording over time. The first and last
+    move of every run stay, so the pointer still arrives where it was
+    before each click, key or scroll. Non-move events are never touched,
+    and kept events keep their original timestamps.
+    """
+    kinds = macro.columns["type"]
+    keep = np.ones(len(macro), dtype=bool)
+    is_move = np.concatenate(([0], (kinds == MOUSE_MOVE).view(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(is_move))
+    x = macro.columns["x"].astype(np.float64)
+    y = macro.columns["y"].astype(np.float64)
+    times = macro.columns["time"]
+    for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        if end - start <= 2:
+            continue
+        run = _path_keep(x[start:end], y[start:end], tolerance) if tolerance > 0 else np.ones(end - start, dtype=bool)
+        if min_interval > 0:
+            run = _spaced(times[start:end], run, min_interval)
+        if max_interval > 0:
+            run = _filled(times[start:end], run, max_interval)
+        keep[start:end] = run
+    return macro.take(keep)
+
+
+def load_json_events(path: str) -> List[Dict[str, Any]]:
+    """Read an event list, or a profile dict holding one under "key_recording"."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("key_recording", [])
+    return data
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.macro_format",
+                                     description="Convert macros between the JSON event list and .ymacro.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="JSON event list -> .ymacro")
+    imp.add_argument("source")
+    imp.add_argument("target")
+    exp = sub.add_parser("export", help=".ymacro -> JSON event list")
+    exp.add_argument("source")
+    exp.add_argument("target")
+    simp = sub.add_parser("simplify", help="simplify mouse paths of a .ymacro (may overwrite the source)")
+    simp.add_argument("source")
+    simp.add_argument("target")
+    simp.add_argument("--tolerance", type=float, default=state.DEFAULT_MACRO_RECORDING["tolerance"],
+                      help="RDP tolerance in pixels (default %(default)s)")
+    simp.add_argument("--min-interval", type=float, default=state.DEFAULT_MACRO_RECORDING["min_interval"],
+                      help="minimum seconds between kept moves (default %(default)s)")
+    simp.add_argument("--max-interval", type=float, default=state.DEFAULT_MACRO_RECORDING["max_interval"],
+                      help="maximum seconds between kept moves, 0 for no limit (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        macro = Macro.from_events(load_json_events(args.source))
+        macro.save(args.target)
+    elif args.command == "export":
+        macro = Macro.open(args.source)
+        with open(args.target, "w", encoding="utf-8") as f:
+            json.dump(macro.to_events(), f)
+    else:
+        source = Macro.open(args.source)
+        macro = simplify_mouse_paths(source, args.tolerance, args.min_interval, args.max_interval)
+        print(f"simplify: {len(source)} -> {len(macro)} events")
+        source.close()
+        macro.save(args.target)
+    print(f"{args.command}: {len(macro)} events, {macro.duration:.1f}s -> {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,62 +2,53 @@ import time
 import threading
 import json
 import os
-import platform
-import logging
-import pyautogui
-import pydirectinput
 from pynput import keyboard, mouse
 from typing import List, Dict, Any
 
+from . import state
 from .state import macro_stop_flag
-from .config import load_config, save_config
-from .platform_utils import left_click
+from .config import load_config, save_config, load_key_recording, save_key_recording
+from .macro_format import (
+    Macro, MacroRecorder, simplify_mouse_paths
+)
+from .playback import MacroPlayer
 
 is_macro_recording = False
-macro_events = []
+macro_recorder = MacroRecorder()
 record_start_time = 0.0
 key_listener = None
 mouse_listener = None
 
-def on_key_press(key):
-    global macro_events, record_start_time
-    timestamp = time.perf_counter() - record_start_time
+def _key_name(key) -> str:
     try:
         key_str = key.char
     except AttributeError:
+        key_str = None
+    if key_str is None:
         key_str = key.name if hasattr(key, 'name') else str(key)
-    macro_events.append({"type": "key_press", "key": key_str, "time": timestamp})
+    return key_str
+
+def on_key_press(key):
+    macro_recorder.key(True, _key_name(key), time.perf_counter() - record_start_time)
 
 def on_key_release(key):
-    global macro_events, record_start_time
-    timestamp = time.perf_counter() - record_start_time
-    try:
-        key_str = key.char
-    except AttributeError:
-        key_str = key.name if hasattr(key, 'name') else str(key)
-    macro_events.append({"type": "key_release", "key": key_str, "time": timestamp})
+    macro_recorder.key(False, _key_name(key), time.perf_counter() - record_start_time)
 
 def on_mouse_move(x, y):
-    global macro_events, record_start_time
-    timestamp = time.perf_counter() - record_start_time
-    macro_events.append({"type": "mouse_move", "x": x, "y": y, "time": timestamp})
+    macro_recorder.move(x, y, time.perf_counter() - record_start_time)
 
 def on_mouse_click(x, y, button, pressed):
-    global macro_events, record_start_time
-    timestamp = time.perf_counter() - record_start_time
-    macro_events.append({"type": "mouse_click", "x": x, "y": y, "button": str(button), "pressed": pressed, "time": timestamp})
+    macro_recorder.click(x, y, str(button), pressed, time.perf_counter() - record_start_time)
 
 def on_mouse_scroll(x, y, dx, dy):
-    global macro_events, record_start_time
-    timestamp = time.perf_counter() - record_start_time
-    macro_events.append({"type": "mouse_scroll", "x": x, "y": y, "dx": dx, "dy": dy, "time": timestamp})
+    macro_recorder.scroll(x, y, dx, dy, time.perf_counter() - record_start_time)
 
 def start_macro_recording():
-    global is_macro_recording, macro_events, record_start_time, key_macro_keyboard_listener, key_macro_mouse_listener
+    global is_macro_recording, macro_recorder, record_start_time, key_macro_keyboard_listener, key_macro_mouse_listener
     if is_macro_recording:
         return
     print("Key Recorder: Recording started.")
-    macro_events = []
+    macro_recorder = MacroRecorder()
     record_start_time = time.perf_counter()
     key_macro_keyboard_listener = keyboard.Listener(on_press=on_key_press, on_release=on_key_release)
     key_macro_mouse_listener = mouse.Listener(on_move=on_mouse_move, on_click=on_mouse_click, on_scroll=on_mouse_scroll)
@@ -75,6 +66,24 @@ def stop_macro_recording():
     key_macro_mouse_listener.join()
     is_macro_recording = False
     print("Key Recorder: Recording stopped.")
+    macro = macro_recorder.build()
+    settings = state.MACRO_RECORDING
+    if settings.get("simplify", True):
+        recorded = len(macro)
+        macro = simplify_mouse_paths(macro, float(settings.get("tolerance", 1.0)), float(settings.get("min_interval", 0.0)),
+                                     float(settings.get("max_interval", 0.0)))
+        print(f"Simplified mouse paths: {recorded} -> {len(macro)} events.")
+    save_recording(macro)
+
+def save_recording(macro: Macro) -> None:
+    """Store a finished recording in the macro profile (or the default profile)."""
+    config = load_config()
+    profile = config.get("macro_profile", config.get("default_profile", ""))
+    if not profile or profile not in config.get("profiles", {}):
+        print("No valid profile selected; recording discarded. Select a profile for macros first.")
+        return
+    save_key_recording(profile, macro)
+    print(f"Saved {len(macro)} events ({macro.duration:.1f}s) to profile: {profile}")
 
 def toggle_macro_recording():
     if not is_macro_recording:
@@ -117,19 +126,51 @@ def clear_macro_for_profile():
     try:
         index = int(choice) - 1
         selected = profile_list[index]
-        config["profiles"][selected]["key_recording"] = []
-        save_config(config)
+        save_key_recording(selected, [])
         print(f"Macro cleared for profile: {selected}")
     except Exception as e:
         print("Invalid input:", e)
 
+def simplify_macro_for_profile():
+    config = load_config()
+    profiles = config.get("profiles", {})
+    if not profiles:
+        print("No profiles available.")
+        return
+    print("Available profiles:")
+    profile_list = list(profiles.keys())
+    for idx, profile in enumerate(profile_list):
+        print(f"{idx+1}) {profile}")
+    choice = input("Select profile number to simplify the macro of: ").strip()
+    try:
+        index = int(choice) - 1
+        selected = profile_list[index]
+    except Exception as e:
+        print("Invalid input:", e)
+        return
+    tolerance = input(f"Tolerance in pixels (default {state.MACRO_RECORDING['tolerance']}): ").strip()
+    min_interval = input(f"Minimum seconds between moves (default {state.MACRO_RECORDING['min_interval']}): ").strip()
+    try:
+        tolerance_px = float(tolerance) if tolerance else float(state.MACRO_RECORDING["tolerance"])
+        interval_s = float(min_interval) if min_interval else float(state.MACRO_RECORDING["min_interval"])
+    except ValueError as e:
+        print("Invalid input:", e)
+        return
+    macro = load_key_recording(selected)
+    recorded = len(macro)
+    simplified = simplify_mouse_paths(macro, tolerance_px, interval_s,
+                                      float(state.MACRO_RECORDING.get("max_interval", 0.0)))
+    save_key_recording(selected, simplified)
+    print(f"Macro for profile {selected}: {recorded} -> {len(simplified)} events.")
+
 def modify_key_macro():
     print("Modify Key Macro mode:")
     print("Options:")
     print("1) Record Macro (Press F8 to toggle recording, F9 to exit)")
     print("2) Select profile to save macro to")
     print("3) Clear macro from profile")
-    print("4) Exit")
+    print("4) Simplify recorded mouse paths")
+    print("5) Exit")
     choice = input("Enter option number: ").strip()
     if choice == "1":
         # Start global hotkeys to record macro.
@@ -147,6 +188,8 @@ def modify_key_macro():
     elif choice == "3":
         clear_macro_for_profile()
     elif choice == "4":
+        simplify_macro_for_profile()
+    elif choice == "5":
         return
     else:
         print("Invalid selection.")
@@ -159,52 +202,9 @@ def play_macro():
     if not default_profile or default_profile not in config.get("profiles", {}):
         print("No valid profile available for macro playback.")
         return
-    macro = config["profiles"][default_profile].get("key_recording", [])
-    if not macro:
+    macro = load_key_recording(default_profile)
+    if not len(macro):
         return
     print("Replaying macro continuously in the background...")
     macro_stop_flag = False
-    while not macro_stop_flag:
-        start_time = time.perf_counter()
-        for event in macro:
-            if macro_stop_flag:
-                break
-            event_time = event.get("time", 0)
-            while time.perf_counter() - start_time < event_time:
-                if macro_stop_flag:
-                    break
-                time.sleep(0.001)
-            if macro_stop_flag:
-                break
-            if platform.system() == "Windows":
-                if event["type"] == "key_press":
-                    pydirectinput.keyDown(event["key"].lower())
-                elif event["type"] == "key_release":
-                    pydirectinput.keyUp(event["key"].lower())
-                elif event["type"] == "mouse_move":
-                    pydirectinput.moveTo(event["x"], event["y"])
-                elif event["type"] == "mouse_click":
-                    if event["pressed"]:
-                        pydirectinput.click(x=event["x"], y=event["y"], button="left")
-                    else:
-                        pydirectinput.mouseUp(x=event["x"], y=event["y"], button="left")
-                elif event["type"] == "mouse_scroll":
-                    try:
-                        pydirectinput.scroll(event["dy"], x=event["x"], y=event["y"])
-                    except Exception as e:
-                        logging.error("Error in mouse_scroll: %s", e)
-            else:
-                if event["type"] == "key_press":
-                    pyautogui.keyDown(event["key"])
-                elif event["type"] == "key_release":
-                    pyautogui.keyUp(event["key"])
-                elif event["type"] == "mouse_move":
-                    pyautogui.moveTo(event["x"], event["y"])
-                elif event["type"] == "mouse_click":
-                    left_click(event["x"], event["y"])
-                elif event["type"] == "mouse_scroll":
-                    try:
-                        pyautogui.scroll(event["dy"], x=event["x"], y=event["y"])
-                    except Exception as e:
-                        logging.error("Error in mouse_scroll: %s", e)
-        time.sleep(0.5)
+    MacroPlayer(macro, should_stop=lambda: macro_stop_flag).play()
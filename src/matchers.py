@@ -1,202 +1,218 @@
 import cv2
 import logging
 import numpy as np
-import pyautogui
 import threading
 import time
-from skimage import exposure
 from typing import Optional, Tuple, List, Dict, Any, Callable
 
+try:
+    import pyautogui
+except Exception:  # no display (headless Linux): only frame-source matching works
+    pyautogui = None
+
 from .state import (
-    MODE, ACCURACY_THRESHOLDS, SCAN_DURATION,
-    template_cache, current_screen_gray,
+    ACCURACY_THRESHOLDS, SCAN_DURATION, TEMPLATE_PYRAMID, CASCADE,
     match_log, match_log_lock,
     last_click_time, last_click_coord, last_click_lock
 )
-from .platform_utils import left_click
+from .capture import Frame, grab_frame, change_detector
+from .features import (
+    get_detector, frame_features, template_features, library_index, descriptor_cache, retain_library_indexes
+)
+from .locations import location_memory
+from .parallel import get_process_pool, get_thread_pool
+from .cascade import method_stats
+from .correlation import ScreenSpectrum, batch_match_template, template_spectra
+from .normalization import search_image, shares_search_image, retain_template_quantiles
+from .templates import template_cache
+from .metrics import metrics
+from .logs import HIT
+from .input_backends import FAILSAFE_EXCEPTIONS, get_input_backend
 
 logger = logging.getLogger(__name__)
 
 class ImageMatcher:
     @staticmethod
-    def match_pyautogui(template_path: str, confidence: Optional[float] = None) -> Optional[Tuple[Tuple[int, int], float]]:
+    def match_pyautogui(template_path: str, confidence: Optional[float] = None, frame: Optional[Frame] = None) -> Optional[Tuple[Tuple[int, int], float]]:
+        if pyautogui is None:
+            logger.error("PyAutoGUI matching unavailable (pyautogui could not be imported).")
+            return None
         try:
             conf = confidence if confidence is not None else ACCURACY_THRESHOLDS.get("pyautogui", 0.8)
-            logging.info("Trying PyAutoGUI matching (confidence=%.2f)...", conf)
-            center = pyautogui.locateCenterOnScreen(template_path, confidence=conf)
-            if center:
-                logging.info("PyAutoGUI found the image at %s", center)
+            logger.debug("Trying PyAutoGUI matching (confidence=%.2f)...", conf)
+            box = pyautogui.locate(template_path, screen_gray_for(frame), grayscale=True, confidence=conf)
+            if box:
+                center = pyautogui.center(box)
+                logger.debug("PyAutoGUI found the image at %s", center)
                 return (center, 1.0)
             return None
         except pyautogui.ImageNotFoundException:
-            logging.info("PyAutoGUI could not find the image on screen.")
+            logger.debug("PyAutoGUI could not find the image on screen.")
             return None
         except Exception as e:
-            logging.error("PyAutoGUI error: %s", e)
+            logger.error("PyAutoGUI error: %s", e)
             return None
 
     @staticmethod
-    def match_template_gray(template_path: str, threshold: Optional[float] = None) -> Optional[Tuple[Tuple[int, int], float]]:
+    def match_template_gray(template_path: str, threshold: Optional[float] = None, frame: Optional[Frame] = None) -> Optional[Tuple[Tuple[int, int], float]]:
         try:
-            logging.info("Trying Template Matching (grayscale)...")
+            logger.debug("Trying Template Matching (grayscale)...")
             template = load_template_image(template_path)
             if template is None:
-                logging.error("Template image not found: %s", template_path)
+                logger.error("Template image not found: %s", template_path)
                 return None
-            global current_screen_gray
-            if current_screen_gray is None:
-                screenshot = pyautogui.screenshot()
-                screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-            else:
-                screen_gray = current_screen_gray
-            if MODE == "accuracy":
-                try:
-                    search_img = exposure.match_histograms(screen_gray, template)
-                except Exception as e:
-                    logging.error("Histogram matching failed: %s", e)
-                    search_img = screen_gray
-            else:
-                search_img = screen_gray
+            frame = ensure_frame(frame)
+            # Accuracy mode remaps the screen to the template's histogram
+            search_img, tag = search_image(template_path, template, frame)
             thresh = threshold if threshold is not None else ACCURACY_THRESHOLDS.get("template", 0.8)
-            result = cv2.matchTemplate(search_img, template, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            levels = pyramid_levels_for(template, search_img)
+            if levels > 0:
+                coarse_screen = None
+                if tag is not None:
+                    coarse_screen = frame.cached(("pyramid", levels, tag), lambda: downscale(search_img, levels))
+                max_val, max_loc = pyramid_match_template(
+                    search_img, template, levels,
+                    int(TEMPLATE_PYRAMID.get("candidates", 5)), coarse_screen
+                )
+            else:
+                result = cv2.matchTemplate(search_img, template, cv2.TM_CCOEFF_NORMED)
+                _, max_val, _, max_loc = cv2.minMaxLoc(result)
             if max_val >= thresh:
                 h, w = template.shape
                 center = (max_loc[0] + w // 2, max_loc[1] + h // 2)
-                logging.info("Template match success (confidence=%.2f) at %s", max_val, center)
+                logger.debug("Template match success (confidence=%.2f) at %s", max_val, center)
                 return (center, max_val)
             else:
-                logging.info("Template match failed (max confidence=%.2f)", max_val)
+                logger.debug("Template match failed (max confidence=%.2f)", max_val)
                 return None
         except Exception as e:
-            logging.error("Template matching error: %s", e)
+            logger.error("Template matching error: %s", e)
             return None
 
     @staticmethod
-    def match_orb(template_path: str) -> Optional[Tuple[Tuple[int, int], float]]:
+    def match_orb(template_path: str, frame: Optional[Frame] = None) -> Optional[Tuple[Tuple[int, int], float]]:
         try:
-            logging.info("Trying ORB feature matching...")
-            orb = cv2.ORB_create(nfeatures=2000, scaleFactor=1.2, nlevels=8, edgeThreshold=15, patchSize=31)
+            logger.debug("Trying ORB feature matching...")
+            orb = get_detector("orb")
             template = load_template_image(template_path)
             if template is None:
-                logging.error("Template image not found: %s", template_path)
+                logger.error("Template image not found: %s", template_path)
                 return None
             
-            global current_screen_gray
-            if current_screen_gray is None:
-                screenshot = pyautogui.screenshot()
-                screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-            else:
-                screen_gray = current_screen_gray
+            frame = ensure_frame(frame)
             
-            kp1, des1 = orb.detectAndCompute(template, None)
-            kp2, des2 = orb.detectAndCompute(screen_gray, None)
-            logging.info("ORB detected %d template keypoints and %d screen keypoints", len(kp1), len(kp2))
+            kp1, des1 = template_features("orb", template_path, template)
+            kp2, des2 = frame_features(frame, "orb")
+            logger.debug("ORB detected %d template keypoints and %d screen keypoints", len(kp1), len(kp2))
             
             if des1 is None or des2 is None or len(kp1) < 10 or len(kp2) < 10:
-                logging.info("ORB: Insufficient features detected to match.")
+                logger.debug("ORB: Insufficient features detected to match.")
                 return None
 
-            bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-            matches = bf.knnMatch(des1, des2, k=2)
+            matches = orb.matcher.knnMatch(des1, des2, k=2)
             good_matches = [m for m, n in matches if m.distance < 0.7 * n.distance]
-            min_matches = ACCURACY_THRESHOLDS.get("orb", 15)
-            logging.info("ORB initial good matches: %d", len(good_matches))
-            
-            if len(good_matches) < min_matches:
-                logging.info("ORB match failed (only %d good matches).", len(good_matches))
-                return None
-
             src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
             dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-            M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 3.0)
+            return ImageMatcher.verify_orb(template, src_pts, dst_pts, frame.gray.shape)
             
-            if M is None:
-                logging.info("ORB: Homography estimation failed.")
-                return None
+        except Exception as e:
+            logger.error("ORB matching error: %s", e)
+            return None
 
-            inlier_count = np.sum(mask)
-            logging.info("ORB homography inliers: %d/%d", inlier_count, len(good_matches))
-            if inlier_count < max(min_matches, 0.25 * len(good_matches)):
-                logging.info("ORB: Insufficient homography inliers.")
-                return None
+    @staticmethod
+    @metrics.timed("verify", method="orb")
+    def verify_orb(template: np.ndarray, src_pts: np.ndarray, dst_pts: np.ndarray, screen_shape: Tuple[int, ...]) -> Optional[Tuple[Tuple[int, int], float]]:
+        """Homography check for ORB correspondences (template points -> screen points)."""
+        num_good = len(src_pts)
+        min_matches = ACCURACY_THRESHOLDS.get("orb", 15)
+        logger.debug("ORB initial good matches: %d", num_good)
+        
+        if num_good < min_matches:
+            logger.debug("ORB match failed (only %d good matches).", num_good)
+            return None
 
-            h, w = template.shape
-            corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
-            transformed_corners = cv2.perspectiveTransform(corners, M)
-            
-            if not cv2.isContourConvex(transformed_corners):
-                logging.info("ORB: Transformed corners are not convex.")
-                return None
-                
-            original_area = h * w
-            transformed_area = cv2.contourArea(transformed_corners)
-            area_ratio = transformed_area / original_area
-            if not (0.1 < area_ratio < 10):
-                logging.info("ORB: Implausible area ratio (%.2f)", area_ratio)
-                return None
+        M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 3.0)
+        
+        if M is None:
+            logger.debug("ORB: Homography estimation failed.")
+            return None
 
-            x_coords = transformed_corners[:, 0, 0]
-            y_coords = transformed_corners[:, 0, 1]
-            center = (int(np.mean(x_coords)), int(np.mean(y_coords)))
-            
-            screen_width, screen_height = pyautogui.size()
-            if not (0 <= center[0] <= screen_width and 0 <= center[1] <= screen_height):
-                logging.info("ORB: Calculated center outside screen boundaries.")
-                return None
+        inlier_count = np.sum(mask)
+        logger.debug("ORB homography inliers: %d/%d", inlier_count, num_good)
+        if inlier_count < max(min_matches, 0.25 * num_good):
+            logger.debug("ORB: Insufficient homography inliers.")
+            return None
 
-            score = inlier_count
-            logging.info("ORB match found (inliers=%d) at %s", score, center)
-            return (center, score)
+        h, w = template.shape
+        corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        transformed_corners = cv2.perspectiveTransform(corners, M)
+        
+        if not cv2.isContourConvex(transformed_corners):
+            logger.debug("ORB: Transformed corners are not convex.")
+            return None
             
-        except Exception as e:
-            logging.error("ORB matching error: %s", e)
+        original_area = h * w
+        transformed_area = cv2.contourArea(transformed_corners)
+        area_ratio = transformed_area / original_area
+        if not (0.1 < area_ratio < 10):
+            logger.debug("ORB: Implausible area ratio (%.2f)", area_ratio)
             return None
 
+        x_coords = transformed_corners[:, 0, 0]
+        y_coords = transformed_corners[:, 0, 1]
+        center = (int(np.mean(x_coords)), int(np.mean(y_coords)))
+        
+        screen_height, screen_width = screen_shape[:2]
+        if not (0 <= center[0] <= screen_width and 0 <= center[1] <= screen_height):
+            logger.debug("ORB: Calculated center outside screen boundaries.")
+            return None
+
+        score = inlier_count
+        logger.debug("ORB match found (inliers=%d) at %s", score, center)
+        return (center, score)
+
     @staticmethod
-    def match_sift(template_path: str, ratio_thresh: float = 0.7, ransac_thresh: float = 5.0) -> Optional[Tuple[Tuple[int, int], float]]:
-        logging.info("Starting SIFT feature matching...")
+    def match_sift(template_path: str, ratio_thresh: float = 0.7, ransac_thresh: float = 5.0, frame: Optional[Frame] = None) -> Optional[Tuple[Tuple[int, int], float]]:
+        logger.debug("Starting SIFT feature matching...")
         if not hasattr(cv2, 'SIFT_create'):
-            logging.error("SIFT not available in this OpenCV installation.")
+            logger.error("SIFT not available in this OpenCV installation.")
             return None
-        sift = cv2.SIFT_create()
+        sift = get_detector("sift")
         template = load_template_image(template_path)
         if template is None:
-            logging.error("Template image not found: %s", template_path)
+            logger.error("Template image not found: %s", template_path)
             return None
         
-        global current_screen_gray
-        if current_screen_gray is None:
-            screenshot = pyautogui.screenshot()
-            screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-        else:
-            screen_gray = current_screen_gray
+        frame = ensure_frame(frame)
         
-        kp1, des1 = sift.detectAndCompute(template, None)
-        kp2, des2 = sift.detectAndCompute(screen_gray, None)
+        kp1, des1 = template_features("sift", template_path, template)
+        kp2, des2 = frame_features(frame, "sift")
         if des1 is None or des2 is None or len(des1) < 2 or len(des2) < 2:
-            logging.info("Insufficient features detected for matching.")
+            logger.debug("Insufficient features detected for matching.")
             return None
 
-        bf = cv2.BFMatcher(cv2.NORM_L2)
-        matches = bf.knnMatch(des1, des2, k=2)
+        matches = sift.matcher.knnMatch(des1, des2, k=2)
         good_matches = [m for m, n in matches if m.distance < ratio_thresh * n.distance]
+        src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+        dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+        return ImageMatcher.verify_sift(template, src_pts, dst_pts, ransac_thresh)
 
+    @staticmethod
+    @metrics.timed("verify", method="sift")
+    def verify_sift(template: np.ndarray, src_pts: np.ndarray, dst_pts: np.ndarray, ransac_thresh: float = 5.0) -> Optional[Tuple[Tuple[int, int], float]]:
+        """Homography check for SIFT correspondences (template points -> screen points)."""
         min_matches = ACCURACY_THRESHOLDS.get("sift", 10)
-        if len(good_matches) < min_matches:
-            logging.info("Not enough good matches: found %d, required %d", len(good_matches), min_matches)
+        if len(src_pts) < min_matches:
+            logger.debug("Not enough good matches: found %d, required %d", len(src_pts), min_matches)
             return None
 
-        src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-        dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-        
         M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, ransac_thresh)
         if M is None or mask is None:
-            logging.info("Homography computation failed.")
+            logger.debug("Homography computation failed.")
             return None
         
         if abs(np.linalg.det(M)) < 1e-5:
-            logging.info("Degenerate homography matrix detected.")
+            logger.debug("Degenerate homography matrix detected.")
             return None
         
         h, w = template.shape[:2]
@@ -205,64 +221,65 @@ class ImageMatcher:
         transformed_corners = cv2.perspectiveTransform(corners, M)
         area = cv2.contourArea(transformed_corners)
         if area < 0.01 * original_area or area > 100 * original_area:
-            logging.info("Transformed area invalid (original: %d, transformed: %d)", original_area, area)
+            logger.debug("Transformed area invalid (original: %d, transformed: %d)", original_area, area)
             return None
 
         hull = cv2.convexHull(transformed_corners)
         centroid = np.mean(hull.squeeze(), axis=0)
         center = (int(centroid[0]), int(centroid[1]))
         score = float(np.sum(mask))
-        logging.info("SIFT match found (inliers=%d) at %s", int(score), center)
+        logger.debug("SIFT match found (inliers=%d) at %s", int(score), center)
         
         return (center, score)
 
     @staticmethod
-    def match_akaze(template_path: str) -> Optional[Tuple[Tuple[int, int], float]]:
+    def match_akaze(template_path: str, frame: Optional[Frame] = None) -> Optional[Tuple[Tuple[int, int], float]]:
         try:
-            logging.info("Trying AKAZE feature matching...")
-            akaze = cv2.AKAZE_create()
+            logger.debug("Trying AKAZE feature matching...")
+            akaze = get_detector("akaze")
             template = load_template_image(template_path)
             if template is None:
-                logging.error("Template image not found: %s", template_path)
+                logger.error("Template image not found: %s", template_path)
                 return None
-            global current_screen_gray
-            if current_screen_gray is None:
-                screenshot = pyautogui.screenshot()
-                screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-            else:
-                screen_gray = current_screen_gray
-            kp1, des1 = akaze.detectAndCompute(template, None)
-            kp2, des2 = akaze.detectAndCompute(screen_gray, None)
+            frame = ensure_frame(frame)
+            kp1, des1 = template_features("akaze", template_path, template)
+            kp2, des2 = frame_features(frame, "akaze")
             if des1 is None or des2 is None:
-                logging.info("AKAZE: insufficient features detected to match.")
+                logger.debug("AKAZE: insufficient features detected to match.")
                 return None
-            bf = cv2.BFMatcher(cv2.NORM_HAMMING)
-            matches = bf.knnMatch(des1, des2, k=2)
+            matches = akaze.matcher.knnMatch(des1, des2, k=2)
             good_matches = [m for m, n in matches if m.distance < 0.7 * n.distance]
-            min_matches = ACCURACY_THRESHOLDS.get("akaze", 10)
-            if len(good_matches) >= min_matches:
-                src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                M, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-                if M is not None:
-                    h, w = template.shape
-                    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
-                    transformed_corners = cv2.perspectiveTransform(corners, M)
-                    x_coords = transformed_corners[:, 0, 0]
-                    y_coords = transformed_corners[:, 0, 1]
-                    center = (int((x_coords.min() + x_coords.max()) / 2),
-                              int((y_coords.min() + y_coords.max()) / 2))
-                    score = len(good_matches)
-                    logging.info("AKAZE match found (good matches=%d) at %s", score, center)
-                    return (center, score)
-                else:
-                    logging.info("AKAZE found %d good matches, but homography failed.", len(good_matches))
-                    return None
+            src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+            dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+            return ImageMatcher.verify_akaze(template, src_pts, dst_pts)
+        except Exception as e:
+            logger.error("AKAZE matching error: %s", e)
+            return None
+
+    @staticmethod
+    @metrics.timed("verify", method="akaze")
+    def verify_akaze(template: np.ndarray, src_pts: np.ndarray, dst_pts: np.ndarray) -> Optional[Tuple[Tuple[int, int], float]]:
+        """Homography check for AKAZE correspondences (template points -> screen points)."""
+        num_good = len(src_pts)
+        min_matches = ACCURACY_THRESHOLDS.get("akaze", 10)
+        if num_good >= min_matches:
+            M, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+            if M is not None:
+                h, w = template.shape
+                corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+                transformed_corners = cv2.perspectiveTransform(corners, M)
+                x_coords = transformed_corners[:, 0, 0]
+                y_coords = transformed_corners[:, 0, 1]
+                center = (int((x_coords.min() + x_coords.max()) / 2),
+                          int((y_coords.min() + y_coords.max()) / 2))
+                score = num_good
+                logger.debug("AKAZE match found (good matches=%d) at %s", score, center)
+                return (center, score)
             else:
-                logging.info("AKAZE match failed (only %d good matches).", len(good_matches))
+                logger.debug("AKAZE found %d good matches, but homography failed.", num_good)
                 return None
-        except Exception as e:
-            logging.error("AKAZE matching error: %s", e)
+        else:
+            logger.debug("AKAZE match failed (only %d good matches).", num_good)
             return None
 
 METHODS = [
@@ -273,57 +290,428 @@ METHODS = [
     ("AKAZE Feature Matching", ImageMatcher.match_akaze)
 ]
 
+def downscale(image: np.ndarray, levels: int) -> np.ndarray:
+    for _ in range(levels):
+        image = cv2.pyrDown(image)
+    return image
+
+def pyramid_levels_for(template: np.ndarray, search_img: np.ndarray) -> int:
+    """Pyramid levels to use for this pair, 0 when pyramid mode is off or the template is too small."""
+    if not TEMPLATE_PYRAMID.get("enabled", False):
+        return 0
+    levels = int(TEMPLATE_PYRAMID.get("levels", 2))
+    min_side = int(TEMPLATE_PYRAMID.get("min_template_side", 8))
+    # Keep enough template detail at the coarsest level to localise it
+    while levels > 0 and min(template.shape[:2]) >> levels < min_side:
+        levels -= 1
+    return levels
+
+def pyramid_match_template(search_img: np.ndarray, template: np.ndarray, levels: int, candidates: int,
+                           coarse_screen: Optional[np.ndarray] = None) -> Tuple[float, Tuple[int, int]]:
+    """Coarse-to-fine TM_CCOEFF_NORMED: top-K peaks at 1/2**levels scale, refined at full resolution.
+
+    Returns (max_val, max_loc) in full-resolution coordinates like cv2.minMaxLoc.
+    """
+    scale = 1 << levels
+    if coarse_screen is None:
+        coarse_screen = downscale(search_img, levels)
+    coarse_tpl = downscale(template, levels)
+    coarse = cv2.matchTemplate(coarse_screen, coarse_tpl, cv2.TM_CCOEFF_NORMED)
+    th, tw = coarse_tpl.shape[:2]
+    peaks: List[Tuple[int, int]] = []
+    for _ in range(max(1, candidates)):
+        _, peak_val, _, (px, py) = cv2.minMaxLoc(coarse)
+        if peak_val <= -1.0:
+            break
+        peaks.append((px, py))
+        # Suppress the neighbourhood so the next peak is a different location
+        coarse[max(0, py - th // 2):py + th // 2 + 1, max(0, px - tw // 2):px + tw // 2 + 1] = -1.0
+
+    h, w = template.shape[:2]
+    screen_h, screen_w = search_img.shape[:2]
+    margin = 2 * scale
+    best_val, best_loc = -1.0, (0, 0)
+    for px, py in peaks:
+        x0 = max(0, px * scale - margin)
+        y0 = max(0, py * scale - margin)
+        x1 = min(screen_w, px * scale + w + margin)
+        y1 = min(screen_h, py * scale + h + margin)
+        if x1 - x0 < w or y1 - y0 < h:
+            continue
+        window = cv2.matchTemplate(search_img[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+        _, val, _, (lx, ly) = cv2.minMaxLoc(window)
+        if val > best_val:
+            best_val, best_loc = val, (x0 + lx, y0 + ly)
+    return best_val, best_loc
+
+# Feature methods answered library-wide from one descriptor index per detector.
+# Below ~16 templates per-template brute force is still the cheaper option.
+INDEXED_METHODS = {
+    "ORB Feature Matching": "orb",
+    "SIFT Feature Matching": "sift",
+    "AKAZE Feature Matching": "akaze",
+}
+INDEXED_MATCHING_MIN_TEMPLATES = 16
+# Template matching shares one screen FFT across templates. Every template
+# still costs a screen-sized inverse DFT, so the saving is the shared forward
+# transform and window statistics, and only while all spectra stay cached.
+BATCHED_TEMPLATE_METHOD = "Grayscale Template Matching"
+BATCHED_TEMPLATE_MIN_TEMPLATES = 4
+
 def load_template_image(template_path: str) -> Optional[np.ndarray]:
-    if template_path in template_cache:
-        return template_cache[template_path]
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    if template is not None:
-        template_cache[template_path] = template
-    return template
-
-def find_best_match(selection_flags: List[bool], template_path: str) -> Tuple[Optional[Tuple[int, int]], Optional[float], Optional[str]]:
-    global current_screen_gray
-    results: List[Tuple[Tuple[int, int], float, str]] = []
-    needs_screenshot: bool = any(flag and METHODS[i][0] != "PyAutoGUI Matching" for i, flag in enumerate(selection_flags))
-    if needs_screenshot:
-        screenshot = pyautogui.screenshot()
-        current_screen_gray = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-    threads: List[threading.Thread] = []
-    results_lock = threading.Lock()
-    def worker(index: int) -> None:
-        method_name, method_func = METHODS[index]
-        logging.info(f"--- Running {method_name} for template {template_path} ---")
-        res = method_func(template_path)
-        if res is not None and isinstance(res, tuple):
-            center, score = res
-            if center is not None:
-                with results_lock:
-                    results.append((center, score, method_name))
-    for idx, flag in enumerate(selection_flags):
-        if flag:
-            t = threading.Thread(target=worker, args=(idx,))
-            t.daemon = True
-            t.start()
-            threads.append(t)
-    for t in threads:
-        t.join()
-    current_screen_gray = None
-    if not results:
-        return None, None, None
-    best = max(results, key=lambda x: x[1])
-    logging.info("Best match using %s with score %.2f at %s", best[2], best[1], best[0])
-    return best[0], best[1], best[2]
+    return template_cache.get(template_path)
+
+def ensure_frame(frame: Optional[Frame]) -> Frame:
+    """Return `frame`, or grab a fresh one from the active frame source if None."""
+    return frame if frame is not None else grab_frame()
+
+def screen_gray_for(frame: Optional[Frame]) -> np.ndarray:
+    return ensure_frame(frame).gray
+
+MatchResult = Tuple[Optional[Tuple[int, int]], Optional[float], Optional[str]]
+
+def find_best_match(selection_flags: List[bool], template_path: str, frame: Optional[Frame] = None) -> MatchResult:
+    return find_best_matches(selection_flags, [template_path], frame=frame)[template_path]
+
+def record_method_run(template_path: str, method_name: str, elapsed: float, hit: bool) -> None:
+    """Feed one method run to the cascade's estimates and the metrics registry."""
+    method_stats.record(template_path, method_name, elapsed, hit)
+    metrics.observe("yasumi_method_seconds", elapsed, method=method_name, template=template_path)
+    metrics.inc("yasumi_matches_total", method=method_name, template=template_path, result="hit" if hit else "miss")
+
+def run_method(index: int, template_path: str, frame: Frame) -> Optional[Tuple[Tuple[int, int], float, str]]:
+    """Run METHODS[index] on `frame`, recording its latency and outcome for the cascade."""
+    method_name, method_func = METHODS[index]
+    logger.debug("--- Running %s for template %s ---", method_name, template_path)
+    start = time.perf_counter()
+    res = method_func(template_path, frame=frame)
+    elapsed = time.perf_counter() - start
+    hit = res is not None and isinstance(res, tuple) and res[0] is not None
+    record_method_run(template_path, method_name, elapsed, hit)
+    if not hit:
+        return None
+    center, score = res
+    return (center[0] + frame.offset[0], center[1] + frame.offset[1]), score, method_name
+
+def run_methods(selection_flags: List[bool], template_path: str, frame: Frame) -> MatchResult:
+    """Run the selected methods for one template on `frame` and keep the best-scoring hit.
+
+    In cascade mode methods run one at a time, cheapest expected cost per
+    hit first, and the first hit wins. Centers are reported in full-screen
+    coordinates, also for cropped frames.
+    """
+    return run_methods_batch(selection_flags, [(template_path, frame)])[template_path]
+
+def run_methods_batch(selection_flags: List[bool], jobs: List[Tuple[str, Frame]]) -> Dict[str, MatchResult]:
+    """Run (template, frame) jobs on the session's persistent matcher pool.
+
+    Every (template, method) pair becomes one pool task; in cascade mode each
+    template's cascade is a single task since its steps are sequential.
+    """
+    pool = get_thread_pool()
+    if CASCADE.get("enabled", False):
+        futures = {tpl: pool.submit(run_cascade, selection_flags, tpl, frame) for tpl, frame in jobs}
+        return {tpl: future.result() for tpl, future in futures.items()}
+    tasks = [
+        (tpl, pool.submit(run_method, idx, tpl, frame))
+        for tpl, frame in jobs
+        for idx, flag in enumerate(selection_flags) if flag
+    ]
+    hits: Dict[str, List[Tuple[Tuple[int, int], float, str]]] = {tpl: [] for tpl, _ in jobs}
+    for tpl, future in tasks:
+        res = future.result()
+        if res is not None:
+            hits[tpl].append(res)
+    results: Dict[str, MatchResult] = {}
+    for tpl, found in hits.items():
+        if not found:
+            results[tpl] = (None, None, None)
+            continue
+        best = max(found, key=lambda x: x[1])
+        logger.debug("Best match using %s with score %.2f at %s", best[2], best[1], best[0])
+        results[tpl] = best
+    return results
+
+def run_cascade(selection_flags: List[bool], template_path: str, frame: Frame) -> MatchResult:
+    indices = {METHODS[idx][0]: idx for idx, flag in enumerate(selection_flags) if flag}
+    for method_name in method_stats.order(template_path, list(indices)):
+        res = run_method(indices[method_name], template_path, frame)
+        if res is not None:
+            logger.debug("Cascade hit using %s with score %.2f at %s", res[2], res[1], res[0])
+            return res
+    return None, None, None
+
+def match_features_indexed(name: str, template_paths: List[str], frame: Frame) -> Dict[str, Tuple[Tuple[int, int], float]]:
+    """Feature-match a whole template library with one indexed query of the screen descriptors.
+
+    Correspondences are grouped back per template and go through the same
+    homography verification as the per-template matchers.
+    """
+    verify = {
+        "orb": lambda tpl, src, dst: ImageMatcher.verify_orb(tpl, src, dst, frame.gray.shape),
+        "sift": ImageMatcher.verify_sift,
+        "akaze": ImageMatcher.verify_akaze,
+    }[name]
+    try:
+        templates: Dict[str, np.ndarray] = {}
+        entries = []
+        for tpl in template_paths:
+            template = load_template_image(tpl)
+            if template is None:
+                logger.error("Template image not found: %s", tpl)
+                continue
+            kps, des = template_features(name, tpl, template)
+            if name == "orb" and len(kps) < 10:
+                continue
+            templates[tpl] = template
+            entries.append((tpl, (kps, des)))
+        screen_features = frame_features(frame, name)
+        if name == "orb" and len(screen_features[0]) < 10:
+            logger.debug("ORB: Insufficient features detected to match.")
+            return {}
+        correspondences = library_index(name, entries).query(screen_features)
+    except Exception as e:
+        logger.error("Indexed %s matching error: %s", name.upper(), e)
+        return {}
+    results: Dict[str, Tuple[Tuple[int, int], float]] = {}
+    for tpl, (src_pts, dst_pts) in correspondences.items():
+        try:
+            res = verify(templates[tpl], src_pts, dst_pts)
+        except Exception as e:
+            logger.error("%s verification error for %s: %s", name.upper(), tpl, e)
+            continue
+        if res is not None:
+            results[tpl] = res
+    return results
+
+def use_batched_template_matching(template_count: int, screen_shape: Tuple[int, ...]) -> bool:
+    """Whether a full-screen template pass should go through the shared screen FFT.
+
+    Accuracy mode remaps the screen per template and pyramid mode is
+    already cheaper per template, so both keep the per-template path. So do
+    libraries whose screen-sized spectra do not all fit the spectra cache.
+    """
+    return (
+        template_count >= BATCHED_TEMPLATE_MIN_TEMPLATES
+        and template_spectra.fits(template_count, screen_shape)
+        and shares_search_image()
+        and not TEMPLATE_PYRAMID.get("enabled", False)
+    )
+
+def match_template_batched(template_paths: List[str], frame: Frame) -> Dict[str, Tuple[Tuple[int, int], float]]:
+    """Grayscale template matching for a whole library against one FFT of the screen.
+
+    Scores are TM_CCOEFF_NORMED like match_template_gray, with the same
+    threshold and center convention.
+    """
+    try:
+        templates: Dict[str, np.ndarray] = {}
+        for tpl in template_paths:
+            template = load_template_image(tpl)
+            if template is None:
+                logger.error("Template image not found: %s", tpl)
+                continue
+            templates[tpl] = template
+        spectrum = frame.cached("spectrum", lambda: ScreenSpectrum(frame.gray))
+        best = batch_match_template(spectrum, templates)
+    except Exception as e:
+        logger.error("Batched template matching error: %s", e)
+        return {}
+    thresh = ACCURACY_THRESHOLDS.get("template", 0.8)
+    results: Dict[str, Tuple[Tuple[int, int], float]] = {}
+    for tpl, (max_val, max_loc) in best.items():
+        if max_val >= thresh:
+            h, w = templates[tpl].shape
+            center = (max_loc[0] + w // 2, max_loc[1] + h // 2)
+            logger.debug("Template match success for %s (confidence=%.2f) at %s", tpl, max_val, center)
+            results[tpl] = (center, max_val)
+        else:
+            logger.debug("Template match failed for %s (max confidence=%.2f)", tpl, max_val)
+    return results
+
+def find_best_matches(selection_flags: List[bool], template_paths: List[str], frame: Optional[Frame] = None) -> Dict[str, MatchResult]:
+    """Match every template against one shared frame, capturing it once if not given.
+
+    Templates with a remembered location are searched in a padded region
+    around it first and only fall back to the full screen on a miss.
+    """
+    if not any(selection_flags):
+        return {tpl: (None, None, None) for tpl in template_paths}
+    if frame is None:
+        frame = grab_frame()
+    results: Dict[str, MatchResult] = {}
+    full_scan: List[str] = []
+    roi_jobs: List[Tuple[str, Frame]] = []
+    for tpl in template_paths:
+        region = location_memory.search_region(tpl, frame.size)
+        if region is not None:
+            roi_jobs.append((tpl, frame.crop(region)))
+        else:
+            full_scan.append(tpl)
+    for tpl, res in run_methods_batch(selection_flags, roi_jobs).items():
+        if res[0] is not None:
+            results[tpl] = res
+        else:
+            logger.debug("No match near last location of %s; searching full screen.", tpl)
+            full_scan.append(tpl)
+    results.update(match_full_frame(selection_flags, full_scan, frame))
+    for tpl, (center, _, _) in results.items():
+        template = load_template_image(tpl) if center is not None else None
+        if template is not None:
+            location_memory.remember(tpl, center, (template.shape[1], template.shape[0]))
+        elif tpl in full_scan:
+            location_memory.forget(tpl)
+    return {tpl: results[tpl] for tpl in template_paths}
+
+def match_full_frame(selection_flags: List[bool], template_paths: List[str], frame: Frame) -> Dict[str, MatchResult]:
+    """Full-screen search; with many templates ORB/SIFT/AKAZE use the library-wide index
+    and template matching shares one FFT of the screen.
+
+    With the "process" executor, the remaining per-template jobs run on worker
+    processes that read the frame from shared memory.
+    """
+    per_template_flags = list(selection_flags)
+    indexed: Dict[str, Dict[str, Tuple[Tuple[int, int], float]]] = {}
+    cascade = CASCADE.get("enabled", False)
+    if not cascade and len(template_paths) >= INDEXED_MATCHING_MIN_TEMPLATES:
+        for idx, (method_name, _) in enumerate(METHODS):
+            if per_template_flags[idx] and method_name in INDEXED_METHODS:
+                per_template_flags[idx] = False
+                with metrics.stage("indexed", method=method_name):
+                    indexed[method_name] = match_features_indexed(INDEXED_METHODS[method_name], template_paths, frame)
+    template_idx = next(idx for idx, (method_name, _) in enumerate(METHODS) if method_name == BATCHED_TEMPLATE_METHOD)
+    if not cascade and per_template_flags[template_idx] and use_batched_template_matching(len(template_paths), frame.gray.shape):
+        per_template_flags[template_idx] = False
+        with metrics.stage("batched", method=BATCHED_TEMPLATE_METHOD):
+            indexed[BATCHED_TEMPLATE_METHOD] = match_template_batched(template_paths, frame)
+    for method_name, hits in indexed.items():
+        for tpl in template_paths:
+            metrics.inc("yasumi_matches_total", method=method_name, template=tpl, result="hit" if tpl in hits else "miss")
+    # The cascade needs each method's outcome before starting the next one
+    pool = get_process_pool() if any(per_template_flags) and not cascade else None
+    pooled = None
+    if pool is not None:
+        with metrics.stage("process_pool"):
+            pooled = pool.run(per_template_flags, template_paths, frame)
+    threaded: Dict[str, MatchResult] = {}
+    if pooled is None and any(per_template_flags):
+        threaded = run_methods_batch(per_template_flags, [(tpl, frame) for tpl in template_paths])
+    results: Dict[str, MatchResult] = {}
+    for tpl in template_paths:
+        candidates: List[MatchResult] = []
+        if pooled is not None:
+            for idx, elapsed, hit in pooled[tpl]:
+                # Worker processes have their own registries; record their runs here
+                record_method_run(tpl, METHODS[idx][0], elapsed, hit is not None)
+                if hit is not None:
+                    candidates.append((hit[0], hit[1], METHODS[idx][0]))
+        elif tpl in threaded:
+            candidates.append(threaded[tpl])
+        for method_name, hits in indexed.items():
+            if tpl in hits:
+                center, score = hits[tpl]
+                candidates.append((center, score, method_name))
+        found = [c for c in candidates if c[0] is not None]
+        results[tpl] = max(found, key=lambda c: c[1]) if found else (None, None, None)
+    return results
+
+# Results matched on the change detector's reference frame, re-dispatched for skipped templates
+_last_results: Dict[str, MatchResult] = {}
+_last_results_lock = threading.Lock()
+
+def match_cycle(selection_flags: List[bool], template_paths: List[str], frame: Frame) -> Dict[str, MatchResult]:
+    """Match one frame, skipping what the change detector says cannot have changed.
+
+    Only templates whose last hit area (or full-screen search) overlaps the
+    changed tiles, or whose periodic full scan is due, are matched again;
+    the others keep their last result, so a target that stays on screen is
+    still reported (and clicked) every cycle. The detector's reference then
+    advances for the re-matched tiles only. A different template set or
+    selection starts from a full pass.
+    """
+    if not change_detector.enabled:
+        return find_best_matches(selection_flags, template_paths, frame=frame)
+    key = (tuple(selection_flags), tuple(template_paths))
+    changes = change_detector.changes(frame, key)
+    areas = {tpl: location_memory.search_area(tpl, frame.size) for tpl in template_paths}
+    rematch: List[str] = []
+    for tpl in template_paths:
+        if changes and location_memory.full_scan_due(tpl):
+            # The full scan searches the whole screen, like a template without a hit
+            areas[tpl] = None
+            rematch.append(tpl)
+        elif changes.overlaps(areas[tpl]):
+            rematch.append(tpl)
+        else:
+            location_memory.skip(tpl)
+    if not rematch:
+        logger.debug("No changes where templates are searched; reusing the last results.")
+    with _last_results_lock:
+        results = {tpl: _last_results.get(tpl, (None, None, None)) for tpl in template_paths}
+    if rematch:
+        results.update(find_best_matches(selection_flags, rematch, frame=frame))
+    with _last_results_lock:
+        _last_results.clear()
+        _last_results.update(results)
+    change_detector.accept(frame, key, changes.within([areas[tpl] for tpl in rematch]))
+    return results
+
+def reset_match_state() -> None:
+    """Forget reference frames, last results and hit locations, e.g. before a new session."""
+    change_detector.reset()
+    location_memory.clear()
+    with _last_results_lock:
+        _last_results.clear()
+
+def warm_up(selection_flags: List[bool], template_paths: List[str]) -> float:
+    """Load and preprocess a profile's templates before matching starts; returns seconds spent.
+
+    Templates and features of any previous profile, and the change
+    detector's reference and remembered hit locations, are dropped first. One
+    discarded full-screen pass then builds descriptors, indexes, spectra,
+    the capture backend and the matcher pools, so the first real cycle runs
+    at steady-state latency.
+    """
+    start = time.perf_counter()
+    reset_match_state()
+    template_cache.retain(template_paths)
+    descriptor_cache.retain(template_paths)
+    retain_library_indexes(template_paths)
+    retain_template_quantiles(template_paths)
+    template_spectra.retain(template_paths)
+    loaded = [tpl for tpl in template_paths if load_template_image(tpl) is not None]
+    if len(template_cache) < len(loaded):
+        logger.warning("Template cache budget (%s MB) is smaller than this profile; expect reloads.",
+                        template_cache.max_bytes // (1024 * 1024))
+    if loaded and any(selection_flags):
+        try:
+            match_full_frame(selection_flags, loaded, grab_frame())
+        except Exception as e:
+            logger.error("Warm-up pass failed: %s", e)
+    # Cold first runs would skew the cascade's latency estimates
+    method_stats.clear()
+    elapsed = time.perf_counter() - start
+    logger.info("Warmed up %d templates (%.1f MB) in %.2fs", len(loaded), template_cache.nbytes / (1024 * 1024), elapsed)
+    return elapsed
+
+def process_templates(selection_flags: List[bool], template_paths: List[str], frame: Optional[Frame] = None) -> None:
+    """Run one scan cycle: a single capture, every template matched, then clicks."""
+    if frame is None:
+        frame = grab_frame()
+    for tpl, res in match_cycle(selection_flags, template_paths, frame).items():
+        handle_match(tpl, *res)
 
 def process_template(selection_flags: List[bool], template_path: str) -> None:
-    global last_click_time, last_click_coord
     center, score, method_used = find_best_match(selection_flags, template_path)
+    handle_match(template_path, center, score, method_used)
+
+def handle_match(template_path: str, center: Optional[Tuple[int, int]], score: Optional[float], method_used: Optional[str]) -> None:
+    global last_click_time, last_click_coord
     if center is not None:
         msg: str = f"Best match for {template_path}: {center} (score: {score} using {method_used})"
-        logging.info(msg)
+        logger.log(HIT, "%s", msg)
         with match_log_lock:
             match_log.append(msg)
-            if len(match_log) > 15:
-                match_log[:] = match_log[-15:]
         current_time: float = time.time()
         click_threshold: float = 20  # minimum distance (pixels) to consider distinct click
         should_click: bool = True
@@ -339,13 +727,18 @@ def process_template(selection_flags: List[bool], template_path: str) -> None:
                 last_click_time = current_time
         if should_click:
             try:
-                # Move to the center and perform a left click using left_click helper
-                pyautogui.moveTo(center[0], center[1])
-                left_click(center[0], center[1])
-                logging.info("Moved to and clicked at %s", center)
-            except pyautogui.FailSafeException:
-                logging.warning("PyAutoGUI FailSafe triggered; click aborted and ignored.")
+                # Move to the center and click through the configured input backend
+                with metrics.stage("click"):
+                    backend = get_input_backend()
+                    backend.click(center[0], center[1])
+                    backend.flush()
+                logger.log(HIT, "Moved to and clicked at %s", center)
+                metrics.inc("yasumi_clicks_total", template=template_path, result="clicked")
+            except FAILSAFE_EXCEPTIONS:
+                logger.warning("PyAutoGUI FailSafe triggered; click aborted and ignored.")
+                metrics.inc("yasumi_clicks_total", template=template_path, result="failed")
         else:
-            logging.info("Click suppressed for %s to avoid rapid repeat clicks.", center)
+            logger.debug("Click suppressed for %s to avoid rapid repeat clicks.", center)
+            metrics.inc("yasumi_clicks_total", template=template_path, result="suppressed")
     else:
-        logging.info("No valid match found for template %s", template_path)
+        logger.debug("No valid match found for template %s", template_path)
@@ -0,0 +1,295 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from . import state
+
+logger = logging.getLogger(__name__)
+
+# Latency bucket upper bounds in seconds (Prometheus "le"); +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Sub-millisecond resolution for macro playback lateness
+LATENESS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Metric families: name -> (type, help)
+FAMILIES: Dict[str, Tuple[str, str]] = {
+    "yasumi_stage_seconds": ("histogram", "Time spent per pipeline stage (capture, grayscale, verify, click, sleep, ...)."),
+    "yasumi_method_seconds": ("histogram", "Time per matcher method call, per template."),
+    "yasumi_matches_total": ("counter", "Matcher method outcomes (hit/miss), per template."),
+    "yasumi_clicks_total": ("counter", "Click decisions (clicked/suppressed/failed), per template."),
+    "yasumi_playback_lateness_seconds": ("histogram", "How late each macro event was dispatched."),
+    "yasumi_playback_events_total": ("counter", "Macro events sent or dropped by the catch-up policy."),
+}
+
+# Histogram families that don't use LATENCY_BUCKETS
+FAMILY_BUCKETS: Dict[str, Tuple[float, ...]] = {
+    "yasumi_playback_lateness_seconds": LATENESS_BUCKETS,
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are estimated within buckets."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                # Linear interpolation inside the bucket, as Prometheus' histogram_quantile does
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(le): n for le, n in zip(self.buckets + (float("inf"),), self._cumulative())},
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+    def _cumulative(self) -> List[int]:
+        total, out = 0, []
+        for n in self.counts:
+            total += n
+            out.append(total)
+        return out
+
+
+class MetricsRegistry:
+    """Process-wide histograms and counters keyed by (family, labels)."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(state.METRICS.get("enabled", True))
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(FAMILY_BUCKETS.get(name, LATENCY_BUCKETS))
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage: str, **labels: str) -> ContextManager[None]:
+        return self.timer("yasumi_stage_seconds", stage=stage, **labels)
+
+    def timed(self, stage: str, **labels: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator recording every call of the function as a stage latency."""
+        def decorate(func: Callable[..., Any]) -> Callable[..., Any]:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.stage(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def histograms(self, name: str) -> List[Tuple[Dict[str, str], Histogram]]:
+        with self._lock:
+            return [(dict(labels), h) for (family, labels), h in self._histograms.items() if family == name]
+
+    def counters(self, name: str) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(dict(labels), v) for (family, labels), v in self._counters.items() if family == name]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = [(name, dict(labels), h.snapshot()) for (name, labels), h in self._histograms.items()]
+            counters = [(name, dict(labels), v) for (name, labels), v in self._counters.items()]
+        return {
+            "timestamp": time.time(),
+            "histograms": [{"name": n, "labels": l, **snap} for n, l, snap in sorted(histograms, key=_sort_key)],
+            "counters": [{"name": n, "labels": l, "value": v} for n, l, v in sorted(counters, key=_sort_key)],
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = sorted(((n, dict(l), h.counts[:], h.count, h.sum, h.buckets)
+                                 for (n, l), h in self._histograms.items()), key=_sort_key)
+            counters = sorted(((n, dict(l), v) for (n, l), v in self._counters.items()), key=_sort_key)
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str) -> None:
+            if name not in described:
+                kind, text = FAMILIES.get(name, ("untyped", ""))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for name, labels, counts, count, total, buckets in histograms:
+            describe(name)
+            cumulative = 0
+            for le, n in zip(buckets + (float("inf"),), counts):
+                cumulative += n
+                bound = "+Inf" if le == float("inf") else repr(le)
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, labels, value in counters:
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _sort_key(item: Tuple[Any, ...]) -> Tuple[str, List[Tuple[str, str]]]:
+    return item[0], sorted(item[1].items())
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsExporter:
+    """Writes the registry to `path` every `interval` seconds on a background thread.
+
+    A .json path gets the JSON snapshot, anything else Prometheus text (e.g.
+    for node_exporter's textfile collector). Files are replaced atomically.
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics, path: Optional[str] = None, interval: Optional[float] = None):
+        self.registry = registry
+        self.path = path if path is not None else state.METRICS.get("export_path", "")
+        self.interval = float(interval if interval is not None else state.METRICS.get("export_interval", 5.0))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        if not self.path:
+            return
+        if self.path.lower().endswith(".json"):
+            text = json.dumps(self.registry.to_json(), indent=2)
+        else:
+            text = self.registry.to_prometheus()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Could not write metrics to %s: %s", self.path, e)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self) -> None:
+        if not self.path or not self.registry.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(self.interval + 1.0)
+        self._thread = None
+        self.write()
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return "   -  " if seconds is None else f"{seconds * 1000:6.1f}"
+
+
+def panel_lines(registry: MetricsRegistry = metrics, max_methods: int = 5) -> List[str]:
+    """Compact p50/p95 table for the curses screens: stages, then the busiest methods."""
+    lines = ["Stage         p50 ms  p95 ms   calls"]
+    for labels, h in sorted(registry.histograms("yasumi_stage_seconds"),
+                            key=lambda item: (item[0].get("stage", ""), item[0].get("method", ""))):
+        name = labels.get("stage", "?") + (f"/{labels['method']}" if "method" in labels else "")
+        lines.append(f"{name[:12]:<12}  {_ms(h.quantile(0.5))}  {_ms(h.quantile(0.95))}  {h.count:6d}")
+    per_method: Dict[str, Histogram] = {}
+    for labels, h in registry.histograms("yasumi_method_seconds"):
+        merged = per_method.setdefault(labels.get("method", "?"), Histogram(h.buckets))
+        merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+        merged.count += h.count
+        merged.sum += h.sum
+    outcomes: Dict[Tuple[str, str], float] = {}
+    for labels, value in registry.counters("yasumi_matches_total"):
+        key = (labels.get("method", "?"), labels.get("result", "?"))
+        outcomes[key] = outcomes.get(key, 0) + value
+    if per_method:
+        lines.append("Method        p50 ms  p95 ms    hits  misses")
+        for method, h in sorted(per_method.items(), key=lambda item: -item[1].sum)[:max_methods]:
+            lines.append(
+                f"{method[:12]:<12}  {_ms(h.quantile(0.5))}  {_ms(h.quantile(0.95))}  "
+                f"{outcomes.get((method, 'hit'), 0):6.0f}  {outcomes.get((method, 'miss'), 0):6.0f}"
+            )
+    lateness = registry.histogram("yasumi_playback_lateness_seconds")
+    if lateness is not None:
+        lines.append(f"Macro lateness p50 {_ms(lateness.quantile(0.5)).strip()} ms, "
+                     f"p99 {_ms(lateness.quantile(0.99)).strip()} ms over {lateness.count} events")
+    clicks: Dict[str, float] = {}
+    for labels, value in registry.counters("yasumi_clicks_total"):
+        clicks[labels.get("result", "?")] = clicks.get(labels.get("result", "?"), 0) + value
+    if clicks:
+        lines.append("Clicks: " + ", ".join(f"{k} {v:.0f}" for k, v in sorted(clicks.items())))
+    return lines
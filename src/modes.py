@@ -6,30 +6,20 @@ import time
 import threading
 from typing import Any, List, Optional, Dict
 import logging
-from logging.handlers import RotatingFileHandler
 
-from .state import global_stop_flag, match_log, match_log_lock, SCAN_DURATION
+from .state import global_stop_flag, match_log, match_log_lock
 from .config import load_config, save_config
-from .matchers import process_template
+from .parallel import shutdown_pools
+from .pipeline import MatchingPipeline
+from .matchers import warm_up
+from .metrics import MetricsExporter, panel_lines
+from .logs import configure_logging, stop_logging
+from .ui.renderer import ScreenRenderer
 from .utils import clear_terminal
 
+KEY_POLL_INTERVAL = 0.05  # seconds between key polls; redraws run on the renderer thread
+LOG_LINES = 15  # match_log lines shown on the matching screens
 
-def configure_logging() -> None:
-    """Configure logging system with rotation and proper formatting"""
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            RotatingFileHandler(
-                'debug.log',
-                maxBytes=2*1024*1024,  # 2MB
-                backupCount=5,
-                encoding='utf-8'
-            ),
-            logging.StreamHandler()
-        ]
-    )
-    logging.captureWarnings(True)
 
 def start_global_stop_listener(stop_key: str) -> None:
     global global_stop_flag, macro_stop_flag
@@ -68,27 +58,53 @@ def start_global_stop_listener(stop_key: str) -> None:
         listener.daemon = True
         listener.start()
 
-def continuous_matching(stdscr: Any, selection_flags: List[bool], valid_image_paths: List[str]) -> None:
+def matching_screen(title: str, template_count: int, pipeline: MatchingPipeline, show_metrics: bool) -> List[str]:
+    """Rows of the matching screens: recent log lines, pipeline status, optional metrics panel."""
+    with match_log_lock:
+        recent: List[str] = list(match_log)[-LOG_LINES:]
+    lines: List[str] = [title, ""] + recent + [""] * (LOG_LINES - len(recent)) + [""]
+    lines.append(f"Processing {template_count} templates")
+    lines.extend(pipeline.status_lines())
+    if show_metrics:
+        lines.append("")
+        lines.extend(panel_lines())
+    return lines
+
+def run_matching_screen(stdscr: Any, title: str, selection_flags: List[bool], valid_image_paths: List[str],
+                        show_metrics: bool) -> None:
+    """Run the pipeline with a renderer thread drawing the screen while this thread polls keys."""
     stdscr.nodelay(True)
-    while not global_stop_flag:
-        stdscr.clear()
-        stdscr.addstr(0, 0, "Continuous Matching Mode: Global stop key is active. Press it to exit. ('q' to quit)")
-        with match_log_lock:
-            for i, line in enumerate(match_log[-15:]):
-                stdscr.addstr(2 + i, 0, line[:stdscr.getmaxyx()[1] - 1])
-        row: int = 18
-        for tpl in valid_image_paths:
-            stdscr.addstr(row, 0, f"Processing template: {tpl}")
-            stdscr.refresh()
-            process_template(selection_flags, tpl)
-            if global_stop_flag:
+    pipeline = MatchingPipeline(selection_flags, valid_image_paths, should_stop=lambda: global_stop_flag)
+    renderer = ScreenRenderer(
+        stdscr, lambda: matching_screen(title, len(valid_image_paths), pipeline, show_metrics)
+    )
+    exporter = MetricsExporter()
+    quit_requested = False
+    try:
+        exporter.start()
+        pipeline.start()
+        renderer.start()
+        while not global_stop_flag:
+            if renderer.poll_key() == ord('q'):
+                quit_requested = True
                 break
-            time.sleep(SCAN_DURATION)
-        stdscr.refresh()
-        time.sleep(SCAN_DURATION)
-        ch: int = stdscr.getch()
-        if ch == ord('q'):
-            sys.exit(0)
+            time.sleep(KEY_POLL_INTERVAL)
+    finally:
+        # Same teardown for the stop key, 'q' and errors: no pool workers or shared memory left behind
+        renderer.stop()
+        pipeline.stop()
+        exporter.stop()
+        shutdown_pools()
+    if quit_requested:
+        stop_logging()
+        sys.exit(0)
+
+def continuous_matching(stdscr: Any, selection_flags: List[bool], valid_image_paths: List[str]) -> None:
+    run_matching_screen(
+        stdscr,
+        "Continuous Matching Mode: Global stop key is active. Press it to exit. ('q' to quit)",
+        selection_flags, valid_image_paths, show_metrics=True
+    )
     stdscr.clear()
     stdscr.addstr(0, 0, "Stop key detected. Exiting continuous matching mode...")
     stdscr.refresh()
@@ -96,66 +112,23 @@ def continuous_matching(stdscr: Any, selection_flags: List[bool], valid_image_pa
 
 def debug_matching_mode(stdscr: Any, selection_flags: List[bool], valid_image_paths: List[str]) -> None:
     """Debug matching mode that follows the same pattern as continuous matching"""
-    global global_stop_flag
-    
-    # Configure logging to capture more detailed information
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.handlers.RotatingFileHandler(
-                'debug.log',
-                maxBytes=2*1024*1024,
-                backupCount=5,
-                encoding='utf-8',
-                delay=True
-            )
-        ],
-        force=True
-    )
-    
     # Add handler to capture logs in match_log
     class MatchLogHandler(logging.Handler):
         def emit(self, record):
             msg = self.format(record)
             with match_log_lock:
                 match_log.append(msg)
-                if len(match_log) > 100:
-                    match_log.pop(0)
-    
+
     match_handler = MatchLogHandler()
     match_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logging.getLogger().addHandler(match_handler)
-    
-    # Use single window approach just like continuous mode
-    stdscr.nodelay(True)
-    
-    # Main loop - identical structure to continuous_matching
-    while not global_stop_flag:
-        stdscr.clear()
-        stdscr.addstr(0, 0, "Debug Matching Mode: Global stop key is active. Press it to exit. ('q' to quit)")
-        
-        # Show logs in the same way continuous mode does
-        with match_log_lock:
-            for i, line in enumerate(match_log[-15:]):
-                stdscr.addstr(2 + i, 0, line[:stdscr.getmaxyx()[1] - 1])
-        
-        row = 18
-        for tpl in valid_image_paths:
-            stdscr.addstr(row, 0, f"Processing template: {tpl}")
-            stdscr.refresh()
-            process_template(selection_flags, tpl)
-            if global_stop_flag:
-                break
-            time.sleep(SCAN_DURATION)
-            
-        stdscr.refresh()
-        time.sleep(SCAN_DURATION)
-        
-        ch = stdscr.getch()
-        if ch == ord('q'):
-            sys.exit(0)
-            
+    # Debug mode logs every method attempt; the writer thread feeds the file and match_log
+    configure_logging("debug", extra_handlers=[match_handler])
+
+    run_matching_screen(
+        stdscr,
+        "Debug Matching Mode: Global stop key is active. Press it to exit. ('q' to quit)",
+        selection_flags, valid_image_paths, show_metrics=False
+    )
     stdscr.clear()
     stdscr.addstr(0, 0, "Stop key detected. Exiting debug matching mode...")
     stdscr.refresh()
@@ -196,6 +169,10 @@ def start_matching_mode(debug: bool = False) -> None:
         print("No methods selected. Exiting.")
         input("Press Enter to return to the main menu...")
         return
+    configure_logging("debug" if debug else None)
+    print(f"Preparing {len(valid_image_paths)} templates...")
+    elapsed: float = warm_up(selection_flags, valid_image_paths)
+    print(f"Templates ready in {elapsed:.2f}s.")
     stop_key: str = config.get("stop_key", "esc")
     mode_label: str = "debug" if debug else "continuous"
     print(f"Starting {mode_label} matching mode. (Global stop key: {stop_key})")
@@ -0,0 +1,117 @@
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from . import state
+from .capture import Frame
+
+# Accuracy-mode photometric normalization of the screen before template matching:
+#   "lut":     histogram matching done as a 256-entry lookup table built from
+#              the frame's CDF (once per frame) and the template's quantiles
+#              (once per load); same mapping as skimage, a fraction of the cost
+#   "skimage": skimage.exposure.match_histograms on the full screen per
+#              template, the original (slow) behaviour, opt-in only
+#   "none":    raw grayscale
+NORMALIZATION_METHODS = ("lut", "skimage", "none")
+
+_template_quantiles: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+_template_quantiles_lock = threading.Lock()
+
+
+def normalization_method() -> str:
+    method = state.NORMALIZATION.get("method", "lut")
+    if method not in NORMALIZATION_METHODS:
+        logging.error("Unknown normalization method %r; using 'lut'.", method)
+        return "lut"
+    return method
+
+
+def _cdf(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(gray levels present, their normalized cumulative counts)."""
+    hist = cv2.calcHist([image], [0], None, [256], [0, 256]).ravel()
+    present = hist > 0
+    cdf = np.cumsum(hist)
+    return np.flatnonzero(present), (cdf / cdf[-1])[present]
+
+
+def frame_cdf(frame: Frame) -> Tuple[np.ndarray, np.ndarray]:
+    """The frame's gray-level CDF, computed once per captured frame.
+
+    Crops use their parent's CDF so ROI searches remap exactly like a
+    full-screen search.
+    """
+    if frame.parent is not None:
+        return frame_cdf(frame.parent)
+    return frame.cached("cdf", lambda: _cdf(frame.gray))
+
+
+def template_quantiles(template_path: str, template: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """The template's gray-level quantiles, computed once per loaded template."""
+    with _template_quantiles_lock:
+        cached = _template_quantiles.get(template_path)
+    # Holding the template keeps identity meaningful: a reload is a new array
+    if cached is not None and cached[0] is template:
+        return cached[1], cached[2]
+    values, quantiles = _cdf(template)
+    with _template_quantiles_lock:
+        _template_quantiles[template_path] = (template, values, quantiles)
+    return values, quantiles
+
+
+def retain_template_quantiles(template_paths: Iterable[str]) -> None:
+    """Drop quantiles (and the template arrays they pin) of templates not in `template_paths`."""
+    keep = set(template_paths)
+    with _template_quantiles_lock:
+        for path in [p for p in _template_quantiles if p not in keep]:
+            del _template_quantiles[path]
+
+
+def histogram_lut(frame: Frame, template_path: str, template: np.ndarray) -> np.ndarray:
+    """Map the frame onto the template's histogram with one table lookup per pixel."""
+    screen_values, screen_cdf = frame_cdf(frame)
+    tpl_values, tpl_quantiles = template_quantiles(template_path, template)
+    table = np.zeros(256, dtype=np.float64)
+    table[screen_values] = np.interp(screen_cdf, tpl_quantiles, tpl_values)
+    return cv2.LUT(frame.gray, np.clip(np.rint(table), 0, 255).astype(np.uint8))
+
+
+def skimage_histogram_matched(screen_gray: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """Opt-in skimage path: remap the whole screen to the template's histogram."""
+    try:
+        from skimage import exposure
+    except ImportError:
+        logging.error("The 'skimage' normalization needs scikit-image; matching on raw grayscale.")
+        return screen_gray
+    try:
+        matched = exposure.match_histograms(screen_gray, template)
+    except Exception as e:
+        logging.error("Histogram matching failed: %s", e)
+        return screen_gray
+    # match_histograms returns floats; matchTemplate needs the template's dtype
+    return np.clip(np.rint(matched), 0, 255).astype(np.uint8)
+
+
+def search_image(template_path: str, template: np.ndarray, frame: Frame) -> Tuple[np.ndarray, Optional[Any]]:
+    """The image to search for `template` in the current mode, plus a cache tag.
+
+    The tag names a search image shared by every template so derived data
+    (pyramids, spectra) can be cached on the frame; it is None when the image
+    was built for this template alone.
+    """
+    if state.MODE != "accuracy":
+        return frame.gray, "gray"
+    method = normalization_method()
+    if method == "lut":
+        return histogram_lut(frame, template_path, template), None
+    if method == "skimage":
+        return skimage_histogram_matched(frame.gray, template), None
+    return frame.gray, "gray"
+
+
+def shares_search_image() -> bool:
+    """False when every template gets its own search image (accuracy mode histogram matching)."""
+    return state.MODE != "accuracy" or normalization_method() == "none"
+
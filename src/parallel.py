@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import state
+from .capture import Frame
+from .logs import configure_worker_logging, forward_worker_logs
+
+logger = logging.getLogger(__name__)
+
+# (shm name, shape, dtype, timestamp, index) - everything a worker needs to map a frame
+FrameHandle = Tuple[str, Tuple[int, ...], str, float, int]
+JobResult = Optional[Tuple[Tuple[int, int], float]]
+# (method index, seconds spent in the worker, hit or None) for one job
+JobRun = Tuple[int, float, JobResult]
+
+
+class SharedFrame:
+    """Copies a frame's grayscale pixels into shared memory once per scan.
+
+    Worker processes map the block read-only by name instead of receiving a
+    pickled copy of the screen with every job.
+    """
+
+    def __init__(self, frame: Frame):
+        gray = np.ascontiguousarray(frame.gray)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, gray.nbytes))
+        view = np.ndarray(gray.shape, dtype=gray.dtype, buffer=self._shm.buf)
+        view[...] = gray
+        self.handle: FrameHandle = (self._shm.name, gray.shape, gray.dtype.str, frame.timestamp, frame.index)
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedFrame":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# Worker-side state: the frame currently mapped in this process
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_frame: Optional[Frame] = None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block; workers share the parent's
+        # resource tracker, so this is a no-op and the parent's unlink clears it
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_frame_for(handle: FrameHandle) -> Frame:
+    """Map the shared frame zero-copy, reusing the mapping (and its caches) across jobs."""
+    global _worker_shm, _worker_frame
+    name, shape, dtype, timestamp, index = handle
+    if _worker_shm is None or _worker_shm.name != name:
+        _worker_frame = None
+        if _worker_shm is not None:
+            _worker_shm.close()
+        _worker_shm = _attach(name)
+        gray = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_worker_shm.buf)
+        gray.flags.writeable = False
+        _worker_frame = Frame(gray, timestamp=timestamp, index=index)
+    return _worker_frame
+
+
+def _init_worker(settings: Dict[str, Any], log_records: Any) -> None:
+    # Spawned workers start with default settings; copy the session's over
+    configure_worker_logging(log_records, settings["log_level"])
+    state.MODE = settings["mode"]
+    state.ACCURACY_THRESHOLDS.update(settings["accuracy_thresholds"])
+    state.TEMPLATE_PYRAMID.update(settings["template_pyramid"])
+    state.NORMALIZATION.update(settings["normalization"])
+
+
+def _run_job(handle: FrameHandle, method_index: int, template_path: str) -> Tuple[float, JobResult]:
+    """Run one method in the worker; returns its latency with the hit so the parent can record both."""
+    from .matchers import METHODS
+    method_name, method_func = METHODS[method_index]
+    frame = _worker_frame_for(handle)
+    start = time.perf_counter()
+    try:
+        res = method_func(template_path, frame=frame)
+    except Exception as e:
+        logger.error("%s failed in worker for %s: %s", method_name, template_path, e)
+        res = None
+    elapsed = time.perf_counter() - start
+    if res is None or res[0] is None:
+        return elapsed, None
+    center, score = res
+    return elapsed, ((int(center[0]), int(center[1])), float(score))
+
+
+class ProcessMatcherPool:
+    """Runs (template x method) matching jobs on worker processes sharing one frame.
+
+    Workers log through a queue into this process's logging; latencies and
+    outcomes come back with every result for the parent to record.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._log_records, self._log_listener = forward_worker_logs()
+        settings = {
+            "log_level": logging.getLogger().getEffectiveLevel(),
+            "mode": state.MODE,
+            "accuracy_thresholds": dict(state.ACCURACY_THRESHOLDS),
+            "template_pyramid": dict(state.TEMPLATE_PYRAMID),
+            "normalization": dict(state.NORMALIZATION),
+        }
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=_init_worker, initargs=(settings, self._log_records)
+        )
+
+    def run(self, selection_flags: List[bool], template_paths: List[str], frame: Frame) -> Dict[str, List[JobRun]]:
+        """Return every job as {template: [(method index, seconds, hit), ...]}, hits in screen coordinates."""
+        runs: Dict[str, List[JobRun]] = {tpl: [] for tpl in template_paths}
+        if not template_paths or not any(selection_flags):
+            return runs
+        with SharedFrame(frame) as shared:
+            futures = [
+                (tpl, idx, self._executor.submit(_run_job, shared.handle, idx, tpl))
+                for tpl in template_paths
+                for idx, flag in enumerate(selection_flags) if flag
+            ]
+            for tpl, idx, future in futures:
+                try:
+                    elapsed, res = future.result()
+                except Exception as e:
+                    logger.error("Matcher worker crashed for %s: %s", tpl, e)
+                    continue
+                if res is not None:
+                    center, score = res
+                    res = (center[0] + frame.offset[0], center[1] + frame.offset[1]), score
+                runs[tpl].append((idx, elapsed, res))
+        return runs
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        # Workers have exited, so every record they sent is already queued
+        self._log_listener.stop()
+        self._log_records.close()
+
+
+class ThreadMatcherPool:
+    """Long-lived matcher threads fed from a job queue, replacing per-call thread spawning.
+
+    OpenCV releases the GIL inside matchTemplate/detectAndCompute/knnMatch,
+    so a thread per core keeps the hot loop parallel without any spawning.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="matcher")
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_thread_pool: Optional[ThreadMatcherPool] = None
+_thread_pool_lock = threading.Lock()
+
+
+def get_thread_pool() -> ThreadMatcherPool:
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadMatcherPool(state.EXECUTOR.get("max_workers") or None)
+        return _thread_pool
+
+
+_process_pool: Optional[ProcessMatcherPool] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> Optional[ProcessMatcherPool]:
+    """The shared process pool when the "process" executor is configured, else None."""
+    global _process_pool
+    if state.EXECUTOR.get("backend", "thread") != "process":
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessMatcherPool(state.EXECUTOR.get("max_workers") or None)
+        return _process_pool
+
+
+def shutdown_pools() -> None:
+    """Stop the matcher pools at the end of a matching session."""
+    global _process_pool, _thread_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
+    with _thread_pool_lock:
+        if _thread_pool is not None:
+            _thread_pool.shutdown()
+            _thread_pool = None
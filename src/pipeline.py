@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .capture import Frame, grab_frame
+from .matchers import handle_match, match_cycle
+from .metrics import metrics
+from .scheduler import ScanScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class LatestQueue:
+    """Bounded hand-off between stages that drops the oldest item instead of blocking.
+
+    A slow consumer therefore always gets the freshest frame/result and the
+    producer never waits on it.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self.maxsize = maxsize
+        self._items: List[Any] = []
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.pop(0)
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.pop(0)
+            self._cond.notify_all()
+            return item
+
+    def wait_empty(self, timeout: Optional[float] = None) -> bool:
+        """Block until the consumer has taken everything queued; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._items, timeout)
+
+    def clear(self) -> None:
+        with self._cond:
+            self._items.clear()
+
+
+class MatchingPipeline:
+    """Capture -> match -> act stages on their own threads, linked by LatestQueues.
+
+    The next frame is captured while the previous one is still being matched
+    (one frame of lookahead; capture then waits for the matcher rather than
+    grabbing frames it would drop) and clicks never block matching. The UI stage is whoever polls `status()`.
+    """
+
+    def __init__(self, selection_flags: List[bool], template_paths: List[str],
+                 should_stop: Callable[[], bool] = lambda: False,
+                 frame_source: Callable[[], Frame] = grab_frame):
+        self.selection_flags = selection_flags
+        self.template_paths = template_paths
+        self.should_stop = should_stop
+        self.frame_source = frame_source
+        self.scheduler = ScanScheduler()
+        self.frames = LatestQueue(maxsize=1)
+        self.actions = LatestQueue(maxsize=1)
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self.frames_captured = 0
+        self.cycles_matched = 0
+        self.clicks_dispatched = 0
+        self.last_latency: Optional[float] = None
+
+    def _running(self) -> bool:
+        return not self._stopped.is_set() and not self.should_stop()
+
+    def _capture_stage(self) -> None:
+        while self._running():
+            if not self.frames.wait_empty(timeout=0.1):
+                continue
+            self.scheduler.start_cycle()
+            try:
+                frame = self.frame_source()
+            except Exception as e:
+                logger.error("Capture failed: %s", e)
+            else:
+                with self._stats_lock:
+                    self.frames_captured += 1
+                self.frames.put(frame)
+            self.scheduler.wait(lambda: not self._running())
+
+    def _match_stage(self) -> None:
+        while self._running():
+            frame = self.frames.get(timeout=0.1)
+            if frame is None:
+                continue
+            try:
+                with metrics.stage("match_cycle"):
+                    results = match_cycle(self.selection_flags, self.template_paths, frame)
+            except Exception as e:
+                logger.error("Matching failed: %s", e)
+                continue
+            with self._stats_lock:
+                self.cycles_matched += 1
+            if any(res[0] is not None for res in results.values()):
+                self.actions.put((frame.timestamp, results))
+
+    def _action_stage(self) -> None:
+        while self._running():
+            item = self.actions.get(timeout=0.1)
+            if item is None:
+                continue
+            captured_at, results = item
+            for tpl, res in results.items():
+                if not self._running():
+                    return
+                try:
+                    handle_match(tpl, *res)
+                except Exception as e:
+                    logger.error("Click dispatch failed for %s: %s", tpl, e)
+            with self._stats_lock:
+                self.clicks_dispatched += sum(1 for res in results.values() if res[0] is not None)
+                self.last_latency = time.perf_counter() - captured_at
+
+    def start(self) -> None:
+        self._stopped.clear()
+        for name, target in (("capture", self._capture_stage), ("match", self._match_stage), ("action", self._action_stage)):
+            thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+        self.frames.clear()
+        self.actions.clear()
+
+    def status(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "frames_captured": self.frames_captured,
+                "frames_dropped": self.frames.dropped,
+                "cycles_matched": self.cycles_matched,
+                "results_dropped": self.actions.dropped,
+                "clicks_dispatched": self.clicks_dispatched,
+                "last_latency": self.last_latency,
+                "scan_rate": self.scheduler.report(),
+            }
+
+    def status_lines(self) -> List[str]:
+        st = self.status()
+        latency = "n/a" if st["last_latency"] is None else f"{st['last_latency'] * 1000:.0f} ms"
+        return [
+            st["scan_rate"],
+            f"Frames: {st['frames_captured']} captured, {st['frames_dropped']} dropped stale, "
+            f"{st['cycles_matched']} matched | Clicks: {st['clicks_dispatched']} | Capture->click latency: {latency}",
+        ]
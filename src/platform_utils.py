@@ -1,8 +1,13 @@
 import platform
 import time
 import ctypes
-import pyautogui
-from typing import Tuple
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+try:
+    import pyautogui
+except Exception:  # no display (headless Linux); input helpers are unavailable
+    pyautogui = None
 
 # Platform-specific left click implementation
 if platform.system() == "Darwin":
@@ -75,6 +80,19 @@ else:
     def send_mouse_event(x: int, y: int, flags: int):
         pyautogui.moveTo(x, y)
 
+@contextmanager
+def high_resolution_timer() -> Iterator[None]:
+    """Raise the Windows timer resolution to 1 ms so short sleeps wake on time."""
+    if platform.system() != "Windows":
+        yield
+        return
+    winmm = ctypes.windll.winmm
+    winmm.timeBeginPeriod(1)
+    try:
+        yield
+    finally:
+        winmm.timeEndPeriod(1)
+
 VK_CODE = {
     'a': 0x41, 'b': 0x42, 'c': 0x43, 'd': 0x44, 'e': 0x45,
     'f': 0x46, 'g': 0x47, 'h': 0x48, 'i': 0x49, 'j': 0x4A,
@@ -0,0 +1,146 @@
+import logging
+import platform
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from . import state
+from .input_backends import FAILSAFE_EXCEPTIONS, InputBackend, button_name, get_input_backend
+from .macro_format import Macro, KEY_PRESS, KEY_RELEASE, MOUSE_MOVE, MOUSE_CLICK, MOUSE_SCROLL
+from .metrics import LATENESS_BUCKETS, Histogram, metrics
+from .platform_utils import high_resolution_timer
+
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP = 0.05  # longest single sleep, so the stop flag is checked regularly
+# Busy-wait window before each deadline: covers sleep overshoot (about 1 ms on
+# Windows even with a 1 ms timer period, ~0.1 ms elsewhere) without burning a core
+DEFAULT_SPIN = 0.0015 if platform.system() == "Windows" else 0.0002
+
+# handler(x, y, a, b) per event type code; see macro_format for the column meanings
+Handler = Callable[[int, int, int, int], None]
+
+
+def backend_dispatch(backend: InputBackend, strings: Sequence[str]) -> List[Handler]:
+    """Dispatch table indexed by event type, with key and button names resolved once up front."""
+    names = list(strings)
+    buttons = [button_name(s) for s in strings]
+
+    def click(x: int, y: int, a: int, b: int) -> None:
+        if b:
+            backend.mouse_down(x, y, buttons[a])
+        else:
+            backend.mouse_up(x, y, buttons[a])
+
+    table: Dict[int, Handler] = {
+        KEY_PRESS: lambda x, y, a, b: backend.key_down(names[a]),
+        KEY_RELEASE: lambda x, y, a, b: backend.key_up(names[a]),
+        MOUSE_MOVE: lambda x, y, a, b: backend.move(x, y),
+        MOUSE_CLICK: click,
+        MOUSE_SCROLL: lambda x, y, a, b: backend.scroll(x, y, b),
+    }
+    return [table[code] for code in (KEY_PRESS, KEY_RELEASE, MOUSE_MOVE, MOUSE_CLICK, MOUSE_SCROLL)]
+
+
+class MacroPlayer:
+    """Replays a Macro against absolute deadlines.
+
+    Events go to an InputBackend: everything already due is queued and sent
+    with one flush before the next wait. Each event is due at pass_start +
+    its timestamp, and passes are
+    scheduled back to back (plus `repeat_gap`), so waiting or dispatch
+    overhead never accumulates. Waits sleep until `spin` seconds before the
+    deadline and busy-wait the rest. With the "drop_moves" catch-up policy,
+    a mouse move that is more than `max_lateness` behind is skipped when the
+    next event is another overdue move; keys, clicks and scrolls are always
+    sent. Lateness of every dispatched event goes to the metrics registry
+    and to a per-pass summary in the log.
+    """
+
+    def __init__(self, macro: Macro, should_stop: Callable[[], bool],
+                 backend: Optional[InputBackend] = None, settings: Optional[Dict] = None):
+        self.macro = macro
+        self.should_stop = should_stop
+        self.backend = backend if backend is not None else get_input_backend()
+        self.dispatch = backend_dispatch(self.backend, macro.strings)
+        settings = settings if settings is not None else state.PLAYBACK
+        spin = settings.get("spin")
+        self.spin = DEFAULT_SPIN if spin is None else float(spin)
+        self.max_lateness = float(settings.get("max_lateness", 0.01))
+        self.drop_moves = settings.get("catch_up", "drop_moves") == "drop_moves"
+        self.repeat_gap = float(settings.get("repeat_gap", 0.5))
+        self.lateness = Histogram(LATENESS_BUCKETS)
+        self.dropped = 0
+
+    def wait_until(self, deadline: float) -> bool:
+        """Sleep, then spin, until `deadline`; False if stopped first."""
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= self.spin:
+                break
+            if self.should_stop():
+                return False
+            time.sleep(min(remaining - self.spin, MAX_SLEEP))
+        while time.perf_counter() < deadline:
+            pass
+        return not self.should_stop()
+
+    def play_pass(self, start: float) -> bool:
+        """Play every event once with deadlines relative to `start`; False if stopped."""
+        dispatch, max_lateness, drop_moves = self.dispatch, self.max_lateness, self.drop_moves
+        rows = self.macro.rows()
+        pending = next(rows, None)
+        while pending is not None:
+            kind, t, x, y, a, b = pending
+            pending = next(rows, None)
+            deadline = start + t
+            now = time.perf_counter()
+            if now < deadline:
+                self.backend.flush()
+                if not self.wait_until(deadline):
+                    return False
+                now = time.perf_counter()
+            elif self.should_stop():
+                self.backend.flush()
+                return False
+            late = now - deadline
+            if (drop_moves and kind == MOUSE_MOVE and late > max_lateness and pending is not None
+                    and pending[0] == MOUSE_MOVE and start + pending[1] <= now):
+                self.dropped += 1
+                metrics.inc("yasumi_playback_events_total", result="dropped")
+                continue
+            dispatch[kind](x, y, a, b)
+            self.lateness.observe(late)
+            metrics.observe("yasumi_playback_lateness_seconds", late)
+        self.backend.flush()
+        return True
+
+    def play(self, repeat: bool = True) -> None:
+        if not len(self.macro):
+            return
+        # The profile's macro may be replaced mid-playback; keep this one mapped until done
+        self.macro.acquire()
+        try:
+            with high_resolution_timer():
+                start = time.perf_counter()
+                while self.play_pass(start):
+                    self.log_pass()
+                    if not repeat or not len(self.macro):
+                        break
+                    start += self.macro.duration + self.repeat_gap
+                    # A pass that overran its slot starts now rather than replaying at full speed
+                    start = max(start, time.perf_counter())
+        except FAILSAFE_EXCEPTIONS:
+            logger.warning("PyAutoGUI FailSafe triggered; macro playback stopped.")
+        finally:
+            self.macro.release()
+
+    def log_pass(self) -> None:
+        h = self.lateness
+        logger.info(
+            "Macro pass: %d events sent, %d moves dropped, lateness p50 %.2f ms, p90 %.2f ms, p99 %.2f ms",
+            h.count, self.dropped, (h.quantile(0.5) or 0) * 1000, (h.quantile(0.9) or 0) * 1000,
+            (h.quantile(0.99) or 0) * 1000,
+        )
+        metrics.inc("yasumi_playback_events_total", h.count, result="sent")
+        self.lateness = Histogram(LATENESS_BUCKETS)
+        self.dropped = 0
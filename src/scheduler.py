@@ -0,0 +1,65 @@
+import collections
+import time
+from typing import Callable, Deque, Optional
+
+from . import state
+from .metrics import metrics
+
+
+def target_period() -> float:
+    """Seconds per scan cycle: 1/scan_rate when set, else scan_duration (per-template refresh period)."""
+    rate = float(state.SCAN_RATE or 0)
+    if rate > 0:
+        return 1.0 / rate
+    return max(0.0, float(state.SCAN_DURATION))
+
+
+class ScanScheduler:
+    """Paces scan cycles against absolute deadlines instead of fixed sleeps.
+
+    `wait()` only sleeps for whatever is left of the current period after the
+    work finished. When a cycle overruns, the next one starts immediately and
+    the schedule is re-anchored rather than bursting to catch up.
+    """
+
+    def __init__(self, period: Optional[float] = None, window: int = 50):
+        self.period = target_period() if period is None else period
+        self._next_deadline: Optional[float] = None
+        self._cycle_starts: Deque[float] = collections.deque(maxlen=window)
+        self.overruns = 0
+
+    def start_cycle(self) -> None:
+        now = time.perf_counter()
+        self._cycle_starts.append(now)
+        if self._next_deadline is None:
+            self._next_deadline = now
+        self._next_deadline += self.period
+        if self._next_deadline < now:
+            self.overruns += 1
+            self._next_deadline = now + self.period
+
+    def wait(self, should_stop: Callable[[], bool] = lambda: False, slice_seconds: float = 0.05) -> None:
+        """Sleep until the current cycle's deadline, waking every slice to check `should_stop`."""
+        if self._next_deadline is None:
+            return
+        with metrics.stage("sleep"):
+            while not should_stop():
+                remaining = self._next_deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                time.sleep(min(remaining, slice_seconds))
+
+    @property
+    def target_rate(self) -> float:
+        return 1.0 / self.period if self.period > 0 else float("inf")
+
+    @property
+    def achieved_rate(self) -> float:
+        if len(self._cycle_starts) < 2:
+            return 0.0
+        span = self._cycle_starts[-1] - self._cycle_starts[0]
+        return (len(self._cycle_starts) - 1) / span if span > 0 else 0.0
+
+    def report(self) -> str:
+        target = "unlimited" if self.period <= 0 else f"{self.target_rate:.2f}/s"
+        return f"Scan rate: {self.achieved_rate:.2f}/s (target {target}, overruns {self.overruns})"
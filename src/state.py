@@ -1,6 +1,6 @@
 import threading
-from typing import Optional, Tuple, List, Dict, Any
-import numpy as np
+from collections import deque
+from typing import Optional, Tuple, Dict, Any, Deque
 
 # Global state variables
 global_stop_flag = False
@@ -8,13 +8,98 @@ macro_stop_flag = False
 last_click_time = 0.0
 last_click_coord: Optional[Tuple[int, int]] = None
 last_click_lock = threading.Lock()
-match_log: List[str] = []
+MATCH_LOG_SIZE = 100  # most recent match/log lines kept for the curses screens
+match_log: Deque[str] = deque(maxlen=MATCH_LOG_SIZE)
 match_log_lock = threading.Lock()
 MODE = "performance"
 ACCURACY_THRESHOLDS: Dict[str, Any] = {}
 SCAN_DURATION = 0.5
-template_cache: Dict[str, np.ndarray] = {}
-current_screen_gray: Optional[np.ndarray] = None
+SCAN_RATE = 0.0  # target scans/sec; 0 = one scan every SCAN_DURATION seconds
+
+DEFAULT_ROI_SETTINGS = {
+    "enabled": True,
+    "padding": 64,             # pixels added around the last hit
+    "full_scan_interval": 10   # force a full-screen scan every N scans (0 = never)
+}
+ROI_SETTINGS: Dict[str, Any] = DEFAULT_ROI_SETTINGS.copy()
+
+DEFAULT_CASCADE = {
+    "enabled": False,          # run cheap methods first and stop at the first hit
+    "smoothing": 0.2,          # EMA factor for per-method latency
+    "min_samples": 3           # runs before a template's own stats are trusted
+}
+CASCADE: Dict[str, Any] = DEFAULT_CASCADE.copy()
+
+DEFAULT_EXECUTOR = {
+    "backend": "thread",       # "thread" or "process" (shared-memory worker processes)
+    "max_workers": 0           # 0 = one per CPU core
+}
+EXECUTOR: Dict[str, Any] = DEFAULT_EXECUTOR.copy()
+
+DEFAULT_CHANGE_DETECTION = {
+    "enabled": True,
+    "cell_size": 16,           # screen pixels per thumbnail pixel
+    "tolerance": 4,            # gray-level change that counts as a real change
+    "grid": [16, 9]            # tiles used to decide which templates to re-match
+}
+CHANGE_DETECTION: Dict[str, Any] = DEFAULT_CHANGE_DETECTION.copy()
+
+DEFAULT_TEMPLATE_PYRAMID = {
+    "enabled": False,
+    "levels": 2,               # match at 1/2**levels scale first
+    "candidates": 5,           # coarse peaks refined at full resolution
+    "min_template_side": 8     # drop levels until the coarse template is at least this big
+}
+TEMPLATE_PYRAMID: Dict[str, Any] = DEFAULT_TEMPLATE_PYRAMID.copy()
+
+DEFAULT_TEMPLATE_CACHE = {
+    "max_megabytes": 256,      # decoded templates kept in memory (least recently used evicted)
+    "revalidate_interval": 1.0 # seconds between checks for a template changed on disk
+}
+TEMPLATE_CACHE: Dict[str, Any] = DEFAULT_TEMPLATE_CACHE.copy()
+
+DEFAULT_METRICS = {
+    "enabled": True,
+    "export_path": "metrics.prom", # ".json" for a JSON snapshot, else Prometheus text; "" = off
+    "export_interval": 5.0     # seconds between metrics file writes
+}
+METRICS: Dict[str, Any] = DEFAULT_METRICS.copy()
+
+DEFAULT_LOGGING = {
+    "level": "production",     # "production" (hits and errors), "info" or "debug"
+    "file": "debug.log",
+    "max_bytes": 2 * 1024 * 1024,
+    "backup_count": 5,
+    "repeat_window": 1.0,      # identical records within this many seconds are dropped (0 = off)
+    "console": False           # also echo records to stderr
+}
+LOGGING: Dict[str, Any] = DEFAULT_LOGGING.copy()
+
+DEFAULT_MACRO_RECORDING = {
+    "simplify": True,          # thin mouse paths when a recording is saved
+    "tolerance": 1.0,          # RDP tolerance in pixels
+    "min_interval": 0.004,     # minimum seconds between kept mouse moves (0 = off)
+    "max_interval": 0.05       # maximum seconds between kept moves while the pointer moves (0 = off)
+}
+MACRO_RECORDING: Dict[str, Any] = DEFAULT_MACRO_RECORDING.copy()
+
+DEFAULT_PLAYBACK = {
+    "spin": None,              # seconds busy-waited before each event; None = platform default
+    "catch_up": "drop_moves",  # "drop_moves": skip overdue mouse moves when behind; "none"
+    "max_lateness": 0.01,      # seconds behind schedule before moves are dropped
+    "repeat_gap": 0.5          # pause between macro repetitions
+}
+PLAYBACK: Dict[str, Any] = DEFAULT_PLAYBACK.copy()
+
+DEFAULT_INPUT = {
+    "backend": "auto"          # "auto", "sendinput" (Windows), "xtest" (X11), "pyautogui" or "recording"
+}
+INPUT: Dict[str, Any] = DEFAULT_INPUT.copy()
+
+DEFAULT_NORMALIZATION = {
+    "method": "lut"            # accuracy mode: "lut", "skimage" (slow) or "none"
+}
+NORMALIZATION: Dict[str, Any] = DEFAULT_NORMALIZATION.copy()
 
 DEFAULT_ACCURACY_THRESHOLDS = {
     "pyautogui": 0.8,
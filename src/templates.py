@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from . import state
+from .utils import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("image", "signature", "digest", "checked")
+
+    def __init__(self, image: np.ndarray, signature: Tuple[int, int], digest: str, checked: float):
+        self.image = image
+        self.signature = signature
+        self.digest = digest
+        self.checked = checked
+
+
+class TemplateCache:
+    """Decoded grayscale templates in LRU order, bounded by a byte budget.
+
+    Each entry remembers the file's (mtime, size) and content hash. Files are
+    re-stat'ed at most every `revalidate_interval` seconds; a changed
+    signature with the same hash (a touch or copy) keeps the decoded image,
+    a different hash reloads it. Settings come from the template_cache
+    config section.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def max_bytes(self) -> int:
+        return int(float(state.TEMPLATE_CACHE.get("max_megabytes", 256)) * 1024 * 1024)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, path: str) -> Optional[np.ndarray]:
+        now = time.monotonic()
+        interval = float(state.TEMPLATE_CACHE.get("revalidate_interval", 1.0))
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                if now - entry.checked < interval:
+                    return entry.image
+            load_lock = self._load_locks.setdefault(path, threading.Lock())
+        # One thread revalidates/loads a path while the others wait for its result
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None and now - entry.checked < interval:
+                    return entry.image
+            return self._revalidate(path, entry, now)
+
+    def _revalidate(self, path: str, entry: Optional[_Entry], now: float) -> Optional[np.ndarray]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        if entry is not None and entry.signature == signature:
+            entry.checked = now
+            return entry.image
+        try:
+            digest = file_digest(path)
+        except OSError:
+            self.discard(path)
+            return None
+        if entry is not None and entry.digest == digest:
+            entry.signature, entry.checked = signature, now
+            return entry.image
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            self.discard(path)
+            return None
+        if entry is not None:
+            logger.info("Template changed on disk, reloaded: %s", path)
+        # Downstream caches key on the array's identity, so it must never change in place
+        image.flags.writeable = False
+        self._insert(path, _Entry(image, signature, digest, now))
+        return image
+
+    def _insert(self, path: str, entry: _Entry) -> None:
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.image.nbytes
+            self._entries[path] = entry
+            self._bytes += entry.image.nbytes
+            budget = self.max_bytes
+            # The entry just inserted always stays, even if it alone exceeds the budget
+            while self._bytes > budget and len(self._entries) > 1:
+                evicted, dropped = self._entries.popitem(last=False)
+                self._bytes -= dropped.image.nbytes
+                logger.debug("Evicted template %s from cache.", evicted)
+
+    def discard(self, path: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry.image.nbytes
+
+    def retain(self, paths: Iterable[str]) -> None:
+        """Drop every template not in `paths`, e.g. the previous profile's."""
+        keep = set(paths)
+        with self._lock:
+            for path in [p for p in self._entries if p not in keep]:
+                self._bytes -= self._entries.pop(path).image.nbytes
+            for path in [p for p in self._load_locks if p not in keep]:
+                del self._load_locks[path]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+template_cache = TemplateCache()
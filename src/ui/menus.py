@@ -269,8 +269,7 @@ def create_new_profile():
     
     config.setdefault("profiles", {})[name] = {
         "path": path,
-        "image_files": [img.strip() for img in images if img.strip()],
-        "key_recording": []
+        "image_files": [img.strip() for img in images if img.strip()]
     }
     save_config(config)
     print(f"Profile '{name}' created")
@@ -0,0 +1,78 @@
+# src/ui/renderer.py
+import curses
+import threading
+from typing import Any, Callable, List, Optional
+
+RENDER_INTERVAL = 0.25  # seconds between redraws; independent of the scan rate
+
+
+class ScreenRenderer:
+    """Redraws a curses screen from its own thread at a fixed rate.
+
+    `build_lines` returns the full screen as a list of rows; only rows that
+    differ from the last frame are rewritten, and a resize forces one full
+    repaint. curses is not thread-safe, so key polling goes through
+    `poll_key`, which shares the drawing lock.
+    """
+
+    def __init__(self, stdscr: Any, build_lines: Callable[[], List[str]], interval: float = RENDER_INTERVAL):
+        self.stdscr = stdscr
+        self.build_lines = build_lines
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._drawn: List[str] = []
+        self._size: Optional[tuple] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def render(self) -> None:
+        # Build outside the lock: collecting status must never wait on the terminal
+        lines = self.build_lines()
+        with self.lock:
+            try:
+                height, width = self.stdscr.getmaxyx()
+                if (height, width) != self._size:
+                    self._size = (height, width)
+                    self._drawn = []
+                    self.stdscr.erase()
+                # The last column of the last row cannot be written without an error
+                rows = [line[:width - 1] for line in lines[:height]]
+                for y, text in enumerate(rows):
+                    if y >= len(self._drawn) or self._drawn[y] != text:
+                        self.stdscr.move(y, 0)
+                        self.stdscr.clrtoeol()
+                        self.stdscr.addstr(y, 0, text)
+                for y in range(len(rows), min(len(self._drawn), height)):
+                    self.stdscr.move(y, 0)
+                    self.stdscr.clrtoeol()
+                self._drawn = rows
+                self.stdscr.noutrefresh()
+                curses.doupdate()
+            except curses.error:
+                # Mid-resize geometry; repaint everything next frame
+                self._size = None
+
+    def _run(self) -> None:
+        while True:
+            self.render()
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ui-renderer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(self.interval + 1.0)
+        self._thread = None
+
+    def poll_key(self) -> int:
+        """Non-blocking getch (the screen must be in nodelay mode); -1 when no key is waiting."""
+        with self.lock:
+            return self.stdscr.getch()
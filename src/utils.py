@@ -1,5 +1,28 @@
 # src/utils.py
+import hashlib
 import os
+import threading
+from typing import Dict, Tuple
 
 def clear_terminal():
-    os.system('cls' if os.name == 'nt' else 'clear')
\ No newline at end of file
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+_digest_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_digest_lock = threading.Lock()
+
+def file_digest(path: str) -> str:
+    """SHA-1 of a file's contents, re-hashed only when its mtime or size changes."""
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _digest_lock:
+        cached = _digest_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _digest_lock:
+        _digest_cache[path] = (signature, digest)
+    return digest
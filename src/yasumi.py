@@ -1,4 +1,6 @@
 # src/yasumi.py
+import multiprocessing
+
 from src.ui.menus import main_menu
 from src.config import load_config
 
@@ -7,4 +9,5 @@ def main():
     main_menu()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # process-pool matching in frozen builds
     main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+
+from src import matchers, state
+from src.capture import Frame
+
+TEMPLATE_METHOD = [name for name, _ in matchers.METHODS].index(matchers.BATCHED_TEMPLATE_METHOD)
+
+
+def template_only() -> list:
+    flags = [False] * len(matchers.METHODS)
+    flags[TEMPLATE_METHOD] = True
+    return flags
+
+
+def test_slow_fade_in_is_matched(tmp_path):
+    """A template fading in below the per-cycle tolerance is still found once it is visible."""
+    rng = np.random.default_rng(0)
+    background = (rng.random((360, 640)) * 255).astype(np.uint8)
+    x0, y0, size = 300, 120, 100
+    background[y0:y0 + size, x0:x0 + size] = 128
+    icon = np.full((size, size), 128, dtype=np.uint8)
+    cv2.rectangle(icon, (10, 10), (60, 45), 20, -1)
+    cv2.circle(icon, (70, 70), 20, 230, -1)
+    cv2.putText(icon, "OK", (15, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 240, 2)
+    path = str(tmp_path / "icon.png")
+    cv2.imwrite(path, icon)
+
+    tolerance = float(state.CHANGE_DETECTION.get("tolerance", 4))
+    step = 0.02  # the icon's largest deviation from the background is 112 levels: ~2.2 per cycle
+    assert 112 * step < tolerance
+    matchers.reset_match_state()
+    found_at = None
+    for cycle in range(60):
+        alpha = min(1.0, cycle * step)
+        gray = background.copy()
+        region = (1 - alpha) * 128 + alpha * icon.astype(np.float32)
+        gray[y0:y0 + size, x0:x0 + size] = np.rint(region).astype(np.uint8)
+        center = matchers.match_cycle(template_only(), [path], Frame(gray))[path][0]
+        if center is not None:
+            found_at = cycle
+            break
+    matchers.reset_match_state()
+    assert found_at is not None
+    assert center == (x0 + size // 2, y0 + size // 2)
+    # Matched as soon as the accumulated change crossed the tolerance, not only on a big jump
+    assert found_at <= 5
@@ -0,0 +1,33 @@
+import numpy as np
+
+from src import state
+from src.macro_format import MOUSE_MOVE, Macro, simplify_mouse_paths
+
+
+def pointer_at(macro: Macro, t: float) -> np.ndarray:
+    """Where playback has put the pointer by time `t`: the last dispatched move."""
+    times = macro.columns["time"]
+    moves = np.flatnonzero((macro.columns["type"] == MOUSE_MOVE) & (times <= t))
+    i = moves[-1]
+    return np.array([macro.columns["x"][i], macro.columns["y"][i]], dtype=np.float64)
+
+
+def test_slow_straight_drag_follows_time():
+    """A straight 0.5 s drag keeps moving during playback instead of jumping at its end."""
+    speed, duration, rate = 400.0, 0.5, 250  # px/s, s, samples/s
+    events = [{"type": "mouse_click", "x": 100, "y": 300, "button": "Button.left", "pressed": True, "time": 0.0}]
+    samples = np.arange(1, int(duration * rate) + 1) / rate
+    events += [{"type": "mouse_move", "x": int(100 + speed * t), "y": 300, "time": float(t)} for t in samples]
+    events.append({"type": "mouse_click", "x": int(100 + speed * duration), "y": 300,
+                   "button": "Button.left", "pressed": False, "time": duration + 0.01})
+    recorded = Macro.from_events(events)
+
+    settings = state.DEFAULT_MACRO_RECORDING
+    simplified = simplify_mouse_paths(recorded, settings["tolerance"], settings["min_interval"], settings["max_interval"])
+    assert len(simplified) < len(recorded)
+
+    # Between kept moves the pointer stands still, so it lags by at most max_interval of travel
+    allowed = speed * settings["max_interval"] + settings["tolerance"] + 1
+    for t in np.linspace(1 / rate, duration, 200):
+        lag = np.linalg.norm(pointer_at(simplified, t) - pointer_at(recorded, t))
+        assert lag <= allowed, f"pointer {lag:.0f} px behind at t={t:.3f}s"